@@ -16,8 +16,9 @@ def main():
 
     mapped_data = collapse_indicators(mapped_data)
 
-    # write the result to parquet and JSON-LD
-    store_method(mapped_data, method)
+    # write the result to parquet, partitioned by method and indicator as
+    # the regionalized method is large, and JSON-LD
+    store_method(mapped_data, method, partitioned=True)
     for m in mapped_data['Method'].unique():
         save_json(method, mapped_data, m)
 
@@ -7,7 +7,10 @@ impact assessment (LCIA) data and optionally applies flow mappings as defined
 in the Federal LCA Commons Elementary Flow List.
 """
 
+import copy
 import json
+import os
+from types import MappingProxyType
 from typing import Union
 
 import pandas as pd
@@ -42,15 +45,7 @@ class Method(Enum):
 
     def get_metadata(cls):
         """Return the stored metadata."""
-        metadata = supported_methods()
-        for m in metadata:
-            if 'case_insensitivity' in m:
-                if m['case_insensitivity'] == 'True':
-                    m['case_insensitivity'] = True
-                else:
-                    m['case_insensitivity'] = False
-            if m['id'] == cls.name:
-                return m
+        return _get_registry()['metadata'].get(cls.name)
 
     def get_filename(cls) -> str:
         """Generate standard filename from method name."""
@@ -64,30 +59,74 @@ class Method(Enum):
 
     def get_class(name: str):
         """Parse method_id from passed string and returns method object."""
-        for n, c in Method.__members__.items():
-            m = c.get_metadata()
-            mapping = None
-            methods = {}
-            if 'mapping' in m:
-                mapping = m['mapping']
-            if 'methods' in m:
-                methods = m['methods']
-            if n == name or c.value == name or mapping == name or name in methods.keys():
-                return c
+        c = _get_registry()['lookup'].get(name)
+        if c is not None:
+            return c
         util.log.warning(f'{name} is not a LCIAfmt Method')
         return name
 
 
-def supported_methods() -> list:
-    """Return a list of dictionaries of supported method meta data."""
+_registry = None
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    return value
+
+
+def _key(value):
+    """Return a hashable version of an argument for the method cache."""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(value)
+    return value
+
+
+def _get_registry() -> dict:
+    """Return the method metadata registry, reading methods.json once.
+
+    The registry holds the raw metadata, read-only metadata by method id and
+    a lookup of Method by id, name, mapping and sub-method name.
+    """
+    global _registry
+    if _registry is not None:
+        return _registry
     json_file = util.datapath / 'methods.json'
     with open(json_file, "r", encoding="utf-8") as f:
-        return json.load(f)
+        methods = json.load(f)
+    metadata = {}
+    for m in copy.deepcopy(methods):
+        if 'case_insensitivity' in m:
+            m['case_insensitivity'] = m['case_insensitivity'] == 'True'
+        metadata.setdefault(m['id'], _freeze(m))
+    lookup = {}
+    for n, c in Method.__members__.items():
+        m = metadata.get(n, {})
+        for key in [n, c.value, m.get('mapping'), *m.get('methods', {})]:
+            if key is not None:
+                lookup.setdefault(key, c)
+    _registry = {'methods': methods,
+                 'metadata': metadata,
+                 'lookup': lookup}
+    return _registry
+
+
+def reload_metadata():
+    """Discard cached method metadata and descriptions so they are read
+    again from file."""
+    global _registry
+    _registry = None
+    util.load_description.cache_clear()
+
+
+def supported_methods() -> list:
+    """Return a list of dictionaries of supported method meta data."""
+    return copy.deepcopy(_get_registry()['methods'])
 
 
 def get_method(method_id, add_factors_for_missing_contexts=True,
                endpoint=True, summary=False, file=None, subset=None,
-               url=None) -> pd.DataFrame:
+               url=None, parallel=False, workers=None) -> pd.DataFrame:
     """Generate the method from source in standard format.
 
     The IDs of supported methods can be obtained using `supported_methods` or
@@ -107,24 +146,73 @@ def get_method(method_id, add_factors_for_missing_contexts=True,
     :param file: str, alternate filepath for method, defaults to file stored
         in cache
     :param url: str, alternate url for method, defaults to url in method config
+    :param parallel: bool, pass-through for RECIPE_2016 and FEDEFL_INV, if
+        True reads the sheets of the source workbook in a pool of processes
+        (RECIPE_2016) or selects the inventories in a pool of threads
+        (FEDEFL_INV)
+    :param workers: int, pass-through for RECIPE_2016 and FEDEFL_INV, number
+        of processes or threads for a parallel run
     :return: DataFrame of method in standard format
+
+    The method is held in memory for later calls with the same arguments
+    (see cache.method_cache_info) and generated again when its source files
+    change; each call returns a copy.
     """
     if not method_id:
         return custom.get_custom_method(file=file)
-    else:
-        method_id = util.check_as_class(method_id)
+    method_id = util.check_as_class(method_id)
+
+    def version():
+        if file is not None and not os.path.isfile(file):
+            return None
+        return tuple(cache.file_hash(f) if os.path.isfile(f) else None
+                     for f in _source_files(method_id, file))
+
+    return cache._method(
+        ('method', method_id, add_factors_for_missing_contexts, endpoint,
+         summary, str(file), _key(subset), url),
+        version,
+        lambda: _get_method(method_id, add_factors_for_missing_contexts,
+                            endpoint, summary, file, subset, url, parallel,
+                            workers))
+
+
+def _source_files(method_id, file) -> list:
+    """Return the paths of the source files of a method: the given file or
+    the files in the cache folder, which are downloaded when missing."""
+    files = []
+    if method_id == Method.TRACI or method_id == Method.TRACI2_2:
+        meta = method_id.get_metadata()
+        files = [traci.source_file] + (
+            [meta['eutro_file']] if 'eutro_url' in meta else [])
+    elif method_id == Method.RECIPE_2016:
+        files = [recipe.source_file]
+    elif method_id == Method.ImpactWorld:
+        import lciafmt.iw as impactworld
+        files = [impactworld.source_file, impactworld.sqlite_file]
+    paths = [cache.get_path(f) for f in files]
+    if file is not None:
+        paths = [file] + paths[1:]
+    return paths
+
+
+def _get_method(method_id, add_factors_for_missing_contexts, endpoint,
+                summary, file, subset, url, parallel, workers):
+    """Generate the method from source, see get_method."""
     if method_id == Method.TRACI or method_id == Method.TRACI2_2:
         return traci.get(method_id, add_factors_for_missing_contexts, file=file, url=None)
     if method_id == Method.RECIPE_2016:
         return recipe.get(add_factors_for_missing_contexts, endpoint, summary,
-                          file=file, url=url)
+                          file=file, url=url, parallel=parallel,
+                          workers=workers)
     if method_id == Method.ImpactWorld:
         import lciafmt.iw as impactworld
         return impactworld.get(file=file, url=url)
     if method_id == Method.IPCC:
         return ipcc.get()
     if method_id == Method.FEDEFL_INV:
-        return fedefl_inventory.get(subset)
+        return fedefl_inventory.get(subset, parallel=parallel,
+                                    workers=workers)
     if method_id == Method.CED:
         return ced.get()
 
@@ -135,17 +223,25 @@ def clear_cache():
 
 
 def to_jsonld(df: pd.DataFrame, zip_file: str, write_flows=False, **kwargs):
-    """Generate a JSONLD file of the methods passed as DataFrame."""
+    """Generate a JSONLD file of the methods passed as DataFrame.
+
+    Pass stream=True to write each indicator as soon as it is complete; df
+    may then also be an iterable of DataFrames sorted by indicator. Pass
+    fast=True to serialize impact factors directly as JSON.
+    """
     util.log.info(f"write JSON-LD package to {zip_file}")
     with jsonld.Writer(zip_file) as w:
         w.write(df, write_flows=write_flows,
                 preferred_only=kwargs.get('preferred_only', False),
                 regions=kwargs.get('regions'),
+                stream=kwargs.get('stream', False),
+                fast=kwargs.get('fast', False),
                 )
 
 
 def map_flows(df: pd.DataFrame, system=None, mapping=None,
-              preserve_unmapped=False, case_insensitive=False) -> pd.DataFrame:
+              preserve_unmapped=False, case_insensitive=False,
+              vectorized=True) -> pd.DataFrame:
     """Map the flows in a method using a mapping from fedelemflowlist.
 
     :param system: str, the named mapping file from fedelemflowlist
@@ -153,11 +249,14 @@ def map_flows(df: pd.DataFrame, system=None, mapping=None,
         specifications
     :param preserve_unmapped: bool, if True unmapped flows remain in the method
     :param case_insensitive, bool, if True case is ignored for source flows
+    :param vectorized: bool, if True the mapping is applied as a join on
+        whole columns, otherwise flows are mapped row by row
     :return: DataFrame of method with mapped flows.
     """
     mapper = fmap.Mapper(df, system=system, mapping=mapping,
                          preserve_unmapped=preserve_unmapped,
-                         case_insensitive=case_insensitive)
+                         case_insensitive=case_insensitive,
+                         vectorized=vectorized)
     mapped = mapper.run()
     x = mapped[mapped[['Method', 'Indicator', 'Flowable', 'Flow UUID', 'Location']
                       ].duplicated(keep=False)]
@@ -176,10 +275,14 @@ def supported_mapping_systems() -> list:
 
 
 def get_mapped_method(method_id, indicators=None, methods=None,
-                      download_from_remote=False) -> pd.DataFrame:
+                      download_from_remote=False, columns=None,
+                      locations=None) -> pd.DataFrame:
     """Return a mapped method stored as parquet.
 
-    If a mapped method does not exist locally, it is generated.
+    If a mapped method does not exist locally, it is generated. The columns
+    and the indicators, methods and locations to return are passed to the
+    parquet reader, so that only the parts of the file that are needed are
+    read.
     :param method_id: class Method or str, based on id field of
         supported_methods
     :param indicators: list, if not None, return only those indicators passed
@@ -187,16 +290,35 @@ def get_mapped_method(method_id, indicators=None, methods=None,
         passed. Applies only to methods with multiple versions.
     :param download_from_remote: bool, if True, download from remote before
         generating method locally.
+    :param columns: list, if not None, return only those columns
+    :param locations: list, if not None, return only the factors for those
+        locations
     :return: DataFrame of mapped method
+
+    The selection is held in memory until the stored method changes (see
+    cache.method_cache_info); each call returns a copy.
     """
     method_id = util.check_as_class(method_id)
-    mapped_method = util.read_method(method_id)
+    return cache._method(
+        ('mapped_method', method_id, _key(indicators), _key(methods),
+         _key(columns), _key(locations)),
+        lambda: util.stored_method_version(method_id),
+        lambda: _get_mapped_method(method_id, indicators, methods,
+                                   download_from_remote, columns, locations))
+
+
+def _get_mapped_method(method_id, indicators, methods, download_from_remote,
+                       columns, locations) -> pd.DataFrame:
+    """Read or generate the mapped method, see get_mapped_method."""
+    selection = {'columns': columns, 'indicators': indicators,
+                 'methods': methods, 'locations': locations}
+    mapped_method = util.read_method(method_id, **selection)
     if mapped_method is None:
         if isinstance(method_id, str):
             raise FileNotFoundError
         elif download_from_remote:
             util.download_method(method_id)
-            mapped_method = util.read_method(method_id)
+            mapped_method = util.read_method(method_id, **selection)
         if mapped_method is None:
             util.log.info('generating ' + method_id.name)
             method = get_method(method_id)
@@ -210,15 +332,11 @@ def get_mapped_method(method_id, indicators=None, methods=None,
                 mapped_method = util.collapse_indicators(mapped_method)
             else:
                 mapped_method = method
-        util.store_method(mapped_method, method_id)
-    if indicators is not None:
-        mapped_method = mapped_method[mapped_method['Indicator'].isin(indicators)]
-        if len(mapped_method) == 0:
-            util.log.error('indicator not found')
-    if methods is not None:
-        mapped_method = mapped_method[mapped_method['Method'].isin(methods)]
-        if len(mapped_method) == 0:
-            util.log.error('specified method not found')
+            util.store_method(mapped_method, method_id)
+            mapped_method = util.select_method(mapped_method, **selection)
+    if len(mapped_method) == 0 and any(
+            x is not None for x in (indicators, methods, locations)):
+        util.log.error('specified indicators, methods or locations not found')
     mapped_method.reset_index(drop=True, inplace=True)
     return mapped_method
 
@@ -257,7 +375,7 @@ def generate_endpoints(file: Union[str, pd.DataFrame],
 def supported_indicators(method_id) -> list:
     """Return a list of indicators for the identified method_id."""
     method_id = util.check_as_class(method_id)
-    method = util.read_method(method_id)
+    method = util.read_method(method_id, columns=['Indicator'])
     if method is not None:
         indicators = set(list(method['Indicator']))
         return list(indicators)
@@ -277,9 +395,9 @@ def apply_lcia_method(df, method_id) -> pd.DataFrame:
         raise TypeError ('DataFrame must containt "FlowUUID" and '
                          '"FlowAmount" columns')
     impact_method = (
-        get_mapped_method(method_id)
-        .drop(columns=['Flowable', 'Context', 'Location', 'Location UUID',
-                       'CAS No', 'Method UUID','Indicator UUID','Unit'])
+        get_mapped_method(method_id,
+                          columns=['Method', 'Indicator', 'Indicator unit',
+                                   'Flow UUID', 'Characterization Factor'])
         .rename(columns={'Flow UUID':'FlowUUID'}))
 
     impacts = df.merge(impact_method, how = 'inner',
@@ -2,20 +2,39 @@
 # !/usr/bin/env python3
 # coding=utf-8
 """
-Functions to support storing and retrieving files from local cache
+Functions to support storing and retrieving files from local cache and
+in-memory caching of fedelemflowlist data
 """
 
+import functools
+import hashlib
 import os
+import re
 import shutil
 import tempfile
+from collections import OrderedDict
 
 import esupy
+import pandas as pd
+import fedelemflowlist
+from fedelemflowlist.globals import flow_list_specs
 
 from .util import log
 
+# maximum number of fedelemflowlist artifacts held in memory
+MAX_FLOWLIST_ARTIFACTS = 8
+_flowlist_artifacts = OrderedDict()
+# content hashes of source files by (path, size, modification time)
+_file_hashes = {}
+# maximum memory in bytes of the methods held in memory
+MAX_METHODS_MEMORY = 1 << 30
+_methods = OrderedDict()
+_method_counts = {'hits': 0, 'misses': 0}
+
 
 def clear():
-    """Delete the cached files."""
+    """Delete the cached files and the methods held in memory."""
+    _methods.clear()
     d = get_folder()
     if not os.path.isdir(d):
         return
@@ -65,3 +84,169 @@ def get_or_download(file: str, url: str) -> str:
         return path
     download(url, file)
     return path
+
+
+def file_hash(path: str) -> str:
+    """Returns the SHA-256 hash of the content of the given file. """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    h = _file_hashes.get(key)
+    if h is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        h = sha.hexdigest()
+        _file_hashes[key] = h
+    return h
+
+
+def parsed(version: int):
+    """Decorator for functions that parse a source file, given as first
+       argument, into a data frame or a tuple of data frames. The result is
+       stored as parquet in the cache folder under the content hash of the
+       file, the function name and `version`, and further positional
+       arguments, so that the file is only parsed again when one of these
+       changes. Keyword arguments are passed to the function but are not part
+       of the key, so they must not change the result. Increase the version
+       when the output of the decorated function changes. When a result is
+       stored, the older results of the function for the same file path are
+       deleted. """
+    def decorator(read):
+        @functools.wraps(read)
+        def wrapper(file, *args, **kwargs):
+            if not os.path.isfile(file):
+                return read(file, *args, **kwargs)
+            key = hashlib.sha256(repr(
+                (file_hash(file), version, args)).encode()).hexdigest()
+            source = hashlib.sha256(
+                os.path.abspath(file).encode()).hexdigest()[:12]
+            prefix = f"{read.__module__}.{read.__name__}_"
+            name = f"{prefix}{source}_{key[:24]}"
+            folder = os.path.join(get_folder(), "parsed")
+            path = os.path.join(folder, name + ".parquet")
+            if os.path.isfile(path):
+                log.info(f"take parsed {read.__name__} of {file} from cache")
+                return pd.read_parquet(path)
+            parts = []
+            while os.path.isfile(part := os.path.join(
+                    folder, f"{name}_{len(parts)}.parquet")):
+                parts.append(part)
+            if len(parts) > 0:
+                log.info(f"take parsed {read.__name__} of {file} from cache")
+                return tuple(pd.read_parquet(part) for part in parts)
+
+            result = read(file, *args, **kwargs)
+            frames = [result] if isinstance(result, pd.DataFrame) else result
+            paths = [path] if isinstance(result, pd.DataFrame) else [
+                os.path.join(folder, f"{name}_{i}.parquet")
+                for i in range(len(frames))]
+            os.makedirs(folder, exist_ok=True)
+            try:
+                # write the first part last, it marks a complete result
+                for frame, part in reversed(list(zip(frames, paths))):
+                    frame.to_parquet(part + ".tmp")
+                    os.replace(part + ".tmp", part)
+                _remove_parsed(folder, prefix, source, key[:24])
+            except (ImportError, TypeError, ValueError) as e:
+                log.warning(f"could not cache {read.__name__} of {file}: {e}")
+                for part in paths + [p + ".tmp" for p in paths]:
+                    if os.path.isfile(part):
+                        os.remove(part)
+            return result
+        return wrapper
+    return decorator
+
+
+def _remove_parsed(folder: str, prefix: str, source: str, key: str):
+    """Deletes the stored results of a parse function for the source file
+       path (or stored under the former names without it) other than the
+       result with the given key. """
+    stale = re.compile(rf"^({source}_(?!{key})[0-9a-f]{{24}}|[0-9a-f]{{24}})"
+                       r"(_\d+)?\.parquet$")
+    for f in os.listdir(folder):
+        if f.startswith(prefix) and stale.match(f[len(prefix):]):
+            log.debug(f"delete stale parsed result {f}")
+            os.remove(os.path.join(folder, f))
+
+
+def _flowlist_artifact(key: tuple, load):
+    """Returns the fedelemflowlist artifact with the given key, loading it
+       once per flow list version. The least recently used artifacts are
+       evicted when more than MAX_FLOWLIST_ARTIFACTS are held. """
+    key = (flow_list_specs['list_version'],
+           flow_list_specs['tool_version']) + key
+    artifact = _flowlist_artifacts.get(key)
+    if artifact is None:
+        log.debug(f"loading {key[2:]} from fedelemflowlist")
+        artifact = load()
+        _flowlist_artifacts[key] = artifact
+    _flowlist_artifacts.move_to_end(key)
+    while len(_flowlist_artifacts) > MAX_FLOWLIST_ARTIFACTS:
+        _flowlist_artifacts.popitem(last=False)
+    return artifact
+
+
+def _method(key: tuple, version, load) -> pd.DataFrame:
+    """Returns a copy of the method frame with the given key, loading it
+    when it is not held in memory or when its version changed. `version` is
+    a function that returns a value which changes with the source of the
+    method, like the hash of a stored file, or None when there is no such
+    value; the frame is then not held. The least recently used methods are
+    evicted when they take more than MAX_METHODS_MEMORY bytes. """
+    entry = _methods.get(key)
+    if entry is not None and entry[0] == version():
+        _methods.move_to_end(key)
+        _method_counts['hits'] += 1
+        return entry[1].copy()
+    _method_counts['misses'] += 1
+    _methods.pop(key, None)
+    df = load()
+    v = version()
+    if v is None or not isinstance(df, pd.DataFrame):
+        return df
+    # the loaded frame is held, only the returned frames are copies
+    _methods[key] = (v, df, int(df.memory_usage(deep=True).sum()))
+    while sum(e[2] for e in _methods.values()) > MAX_METHODS_MEMORY:
+        _methods.popitem(last=False)
+    return df.copy()
+
+
+def method_cache_info() -> dict:
+    """Returns the number of hits and misses of the methods held in memory
+    by get_method and get_mapped_method, the number of methods held and
+    their memory in bytes. """
+    return {'hits': _method_counts['hits'],
+            'misses': _method_counts['misses'],
+            'methods': len(_methods),
+            'memory': sum(e[2] for e in _methods.values())}
+
+
+def get_flows(preferred_only=False, subset=None):
+    """Returns a copy of the (cached) flow list from fedelemflowlist. """
+    return _flowlist_artifact(
+        ('flows', preferred_only, subset),
+        lambda: fedelemflowlist.get_flows(preferred_only=preferred_only,
+                                          subset=subset)).copy()
+
+
+def get_flowmapping(source=None):
+    """Returns a copy of the (cached) flow mapping from fedelemflowlist. """
+    return _flowlist_artifact(
+        ('flowmapping', source),
+        lambda: fedelemflowlist.get_flowmapping(source=source)).copy()
+
+
+def get_alt_conversion():
+    """Returns a copy of the (cached) alternate unit conversions from
+       fedelemflowlist. """
+    return _flowlist_artifact(
+        ('alt_conversion',),
+        fedelemflowlist.get_alt_conversion).copy()
+
+
+def get_mapping_systems() -> set:
+    """Returns the (cached) set of source lists in the flow mappings. """
+    return set(_flowlist_artifact(
+        ('mapping_systems',),
+        lambda: frozenset(get_flowmapping()['SourceListName'].unique())))
@@ -5,6 +5,7 @@
 Functions to support generating a dataframe from list of elements
 """
 
+import numpy
 import pandas
 
 lciafmt_cols = [
@@ -75,3 +76,33 @@ def record(records: list,
         location_uuid,
         factor])
     return records
+
+
+def from_columns(size: int,
+                 method="",
+                 method_uuid="",
+                 indicator="",
+                 indicator_uuid="",
+                 indicator_unit="",
+                 flow="",
+                 flow_uuid="",
+                 flow_category="",
+                 flow_unit="",
+                 cas_number="",
+                 location="",
+                 location_uuid="",
+                 factor=0.0) -> pandas.DataFrame:
+    """Create a data frame with `size` rows from the given columns. The
+    arguments are the same as for `record`, but each can also be an array
+    of values; a single value is repeated for all rows."""
+    values = [method, method_uuid, indicator, indicator_uuid, indicator_unit,
+              flow, flow_uuid, flow_category, flow_unit, cas_number,
+              location, location_uuid, factor]
+    data = {}
+    for col, v in zip(lciafmt_cols, values):
+        if numpy.ndim(v) == 0:
+            v = numpy.full(size, v, dtype=object)
+        elif col != "Characterization Factor":
+            v = numpy.asarray(v, dtype=object)
+        data[col] = v
+    return pandas.DataFrame(data, columns=lciafmt_cols)
@@ -35,13 +35,13 @@ def apply_endpoints(endpoints, matching_fields, download_from_remote=False):
     for m in indicators['Method'].unique():
         method_indicators = indicators[indicators['Method'] == m]
         mapped_method = (
-            lciafmt.get_mapped_method(m,
-                                      methods=[m],
-                                      download_from_remote=download_from_remote)
+            lciafmt.get_mapped_method(
+                m,
+                indicators=(list(method_indicators['Indicator'].dropna())
+                            if 'Indicator' in matching_fields else None),
+                methods=[m],
+                download_from_remote=download_from_remote)
             .fillna(''))
-        if 'Indicator' in matching_fields:
-            mapped_method = mapped_method[mapped_method['Indicator'].isin(
-                list(method_indicators['Indicator']))]
         endpoint_method = mapped_method.merge(
             endpoints[matching_fields + ['Method', 'Endpoint Indicator',
                                          'Endpoint Indicator unit',
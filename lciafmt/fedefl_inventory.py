@@ -7,53 +7,74 @@ from the EPA Federal Elementary Flow List (fedelemflowlist)
 (https://github.com/USEPA/Federal-LCA-Commons-Elementary-Flow-List)
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
-import fedelemflowlist as flowlist
 import fedelemflowlist.subset_list as subsets
 
+import lciafmt.cache as cache
 import lciafmt.df as dfutil
+from lciafmt.util import log
 
 
-def get(subset=None) -> pd.DataFrame:
+def get(subset=None, parallel=False, workers=None) -> pd.DataFrame:
     """Generate an inventory method from the FEDEFL.
 
     :param subset: a list of dictionary keys from available inventories, if
     none selected all availabile inventories will be generated
+    :param parallel: bool, if True the inventories are selected from the flow
+        list in a pool of threads
+    :param workers: int, number of threads for a parallel selection, defaults
+        to the number of inventories
     :return: df in standard LCIAmethod format
     """
-    method = dfutil.data_frame(list())
-    method['Characterization Factor'] = pd.to_numeric(
-        method['Characterization Factor'])
-
     if subset is None:
         list_of_inventories = [s for s in subsets.get_subsets() if s
                                not in ('ced')]
     else:
         list_of_inventories = subset
 
-    alt_units = flowlist.get_alt_conversion()
-    for inventory in list_of_inventories:
-        flows = flowlist.get_flows(subset=inventory)
-        flows.drop(['Formula', 'Synonyms', 'Class', 'External Reference',
-                    'Preferred', 'AltUnit', 'AltUnitConversionFactor'],
-                   axis=1, inplace=True)
-        flows['Indicator'] = inventory
-        flows['Indicator unit'] = subsets.get_inventory_unit(inventory)
-        flows['Characterization Factor'] = 1.0
-
-        # Apply unit conversions where flow unit differs from indicator unit
-        flows_w_conversion = pd.merge(flows, alt_units, how='left',
-                                      left_on=['Flowable', 'Indicator unit', 'Unit'],
-                                      right_on=['Flowable', 'AltUnit', 'Unit'])
-        flows_w_conversion.loc[
-            (flows_w_conversion['AltUnit'] == flows_w_conversion['Indicator unit']),
-            'Characterization Factor'] = flows_w_conversion['AltUnitConversionFactor']
-        flows_w_conversion.drop(
-            ['AltUnit', 'AltUnitConversionFactor', 'InverseConversionFactor'],
-            axis=1, inplace=True)
-
-        method = pd.concat([method, flows_w_conversion], ignore_index=True)
+    # the flow list is loaded once, each inventory selects its flows from it
+    # with the subset function that fedelemflowlist.get_flows would apply
+    flows = cache.get_flows()
+
+    def select(inventory):
+        return getattr(subsets, subsets.subsets[inventory])(flows)
+
+    if parallel and len(list_of_inventories) > 1:
+        log.info(f"select {len(list_of_inventories)} inventories in "
+                 f"{workers or len(list_of_inventories)} threads")
+        with ThreadPoolExecutor(
+                max_workers=workers or len(list_of_inventories)) as pool:
+            selections = list(pool.map(select, list_of_inventories))
+    else:
+        selections = [select(inventory) for inventory in list_of_inventories]
+    sizes = [len(selection) for selection in selections]
+
+    method = pd.concat(
+        [dfutil.data_frame(list())] + [
+            selection.drop(['Formula', 'Synonyms', 'Class',
+                            'External Reference', 'Preferred', 'AltUnit',
+                            'AltUnitConversionFactor'], axis=1)
+            for selection in selections], ignore_index=True)
+    method['Indicator'] = np.repeat(
+        np.array(list_of_inventories, dtype=object), sizes)
+    method['Indicator unit'] = np.repeat(
+        np.array([subsets.get_inventory_unit(inventory)
+                  for inventory in list_of_inventories], dtype=object), sizes)
+    method['Characterization Factor'] = 1.0
+
+    # Apply unit conversions where flow unit differs from indicator unit
+    alt_units = cache.get_alt_conversion()
+    method = pd.merge(method, alt_units, how='left',
+                      left_on=['Flowable', 'Indicator unit', 'Unit'],
+                      right_on=['Flowable', 'AltUnit', 'Unit'])
+    method.loc[(method['AltUnit'] == method['Indicator unit']),
+               'Characterization Factor'] = method['AltUnitConversionFactor']
+    method.drop(['AltUnit', 'AltUnitConversionFactor',
+                 'InverseConversionFactor'], axis=1, inplace=True)
 
     method['Method'] = 'FEDEFL Inventory'
     return method
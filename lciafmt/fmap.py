@@ -5,24 +5,32 @@
 Functions to support flow mapping for lcia methods
 """
 
+from functools import lru_cache
 from typing import List
 
+import numpy as np
 import pandas as pd
-import fedelemflowlist as flowlist
+from fedelemflowlist.globals import flow_list_specs
+from esupy.processed_data_mgmt import mkdir_if_missing
 from esupy.util import make_uuid
 
+import lciafmt.cache as cache
 import lciafmt.df as dfutil
-from .util import log
+from .util import log, OUTPUTPATH
+
+# compiled mapping tables that were already loaded, by file path
+_map_tables = {}
+# the version of the compiled mapping tables; increase it when the
+# compilation of the tables changes, e.g. the flow keys or the
+# normalization of categories
+MAP_TABLE_VERSION = 1
 
 
 def supported_mapping_systems() -> list:
-    fmap = flowlist.get_flowmapping()  # type: pd.DataFrame
-    systems = set()
-    for i in range(0, len(fmap.index)):
-        systems.add(fmap.iat[i, 0])
-    return list(systems)
+    return list(cache.get_mapping_systems())
 
 
+@lru_cache(maxsize=1024)
 def norm_category(category_path: str) -> str:
     if category_path is None:
         return ""
@@ -76,6 +84,20 @@ def norm_category(category_path: str) -> str:
     return "/".join(norm)
 
 
+def norm_categories(categories: pd.Series) -> pd.Series:
+    """Return the normalized categories of a column as categorical column.
+
+    Only the unique values of the column are normalized; missing values
+    remain missing.
+    """
+    codes, uniques = pd.factorize(categories)
+    norm = pd.Index([norm_category(c) for c in uniques])
+    norm_uniques = norm.unique()
+    lookup = np.append(norm_uniques.get_indexer(norm), -1)
+    return pd.Series(pd.Categorical.from_codes(lookup[codes], norm_uniques),
+                     index=categories.index, name=categories.name)
+
+
 def _is_empty(val: str) -> bool:
     if val is None or val == "":
         return True
@@ -107,25 +129,27 @@ class _FlowInfo(object):
 class Mapper(object):
 
     def __init__(self, df: pd.DataFrame, system=None, mapping=None,
-                 preserve_unmapped=False, case_insensitive=False):
+                 preserve_unmapped=False, case_insensitive=False,
+                 vectorized=True):
         self.__df = df
         self.__system = system
+        # flow keys of source flows are always compared in lower case
         self.__case_insensitive = case_insensitive
-        if mapping is None:
-            if system is None:
-                log.warning("pass dataframe as mapping or identify system")
-            else:
-                log.info(f"loading flow mapping {system} from fedelemflowlist")
-                mapping = flowlist.get_flowmapping(source=system)
-                if self.__case_insensitive:
-                    mapping['SourceFlowName'] = mapping['SourceFlowName'].str.lower()
+        if mapping is None and system is None:
+            log.warning("pass dataframe as mapping or identify system")
         self.__mapping = mapping  # type: pd.DataFrame
         self.__preserve_unmapped = preserve_unmapped
+        self.__vectorized = vectorized
 
     def run(self) -> pd.DataFrame:
-        if self.__mapping is None:
+        if self.__mapping is None and self.__system is None:
             log.warning("No mapping applied")
             return self.__df
+        if self.__vectorized:
+            return self._run_columns()
+        return self._run_rows()
+
+    def _run_rows(self) -> pd.DataFrame:
         map_idx = self._build_map_index()
         log.info("applying flow mapping...")
         mapped = 0
@@ -163,35 +187,71 @@ class Mapper(object):
                  mapped, preserved)
         return dfutil.data_frame(records)
 
+    def _run_columns(self) -> pd.DataFrame:
+        """Apply the mapping by joining the flow keys of the method against
+        the mapping table; produces the same frame as `_run_rows`."""
+        table = self._build_map_table()
+        log.info("applying flow mapping...")
+        df = self.__df.iloc[:, 0:13].set_axis(dfutil.lciafmt_cols, axis=1)
+        keys = pd.DataFrame({
+            'key': Mapper._flow_keys(uuid=df['Flow UUID'],
+                                     name=df['Flowable'],
+                                     category=df['Context'],
+                                     unit=df['Unit']).values,
+            '_row': np.arange(len(df))})
+        how = 'left' if self.__preserve_unmapped else 'inner'
+        joined = (keys.merge(table, how=how, on='key', sort=False)
+                      .sort_values(['_row', '_target'], kind='stable'))
+        is_mapped = joined['_target'].notna().values
+
+        unmapped = keys.loc[~keys['key'].isin(table['key']), 'key']
+        for key in unmapped.unique():
+            log.debug("could not map flow %s", key)
+
+        mapped = int(is_mapped.sum())
+        preserved = len(joined) - mapped
+        log.info("created %i factors for mapped flows; " +
+                 "preserved %i factors for unmapped flows",
+                 mapped, preserved)
+        if len(joined) == 0:
+            return dfutil.data_frame([])
+
+        out = df.iloc[joined['_row'].values].reset_index(drop=True)
+        out = out.astype(object)
+        for col, target in (('Flowable', 'TargetFlowName'),
+                            ('Flow UUID', 'TargetFlowUUID'),
+                            ('Context', 'TargetFlowContext'),
+                            ('Unit', 'TargetUnit')):
+            out.loc[is_mapped, col] = joined.loc[is_mapped, target].values
+        factors = out['Characterization Factor'].values
+        factors[is_mapped] = (factors[is_mapped] /
+                              joined['ConversionFactor'].values[is_mapped])
+        out['Characterization Factor'] = factors
+        return out.infer_objects()
+
     def _build_map_index(self) -> dict:
         log.debug("index flows")
         map_idx = {}
-        for _, row in self.__mapping.iterrows():
-            sys = row["SourceListName"]
-            if self.__system is not None and sys != self.__system:
-                continue
-            key = Mapper._flow_key(
-                uuid=row["SourceFlowUUID"],
-                name=row["SourceFlowName"],
-                category=row["SourceFlowContext"],
-                unit=row["SourceUnit"],
-            )
-            targets = map_idx.get(key)
+        table = self._build_map_table()
+        for row in table.itertuples(index=False):
+            targets = map_idx.get(row.key)
             if targets is None:
                 targets = []
-                map_idx[key] = targets
+                map_idx[row.key] = targets
             targets.append(_FlowInfo(
-                uuid=row["TargetFlowUUID"],
-                name=row["TargetFlowName"],
-                category=row["TargetFlowContext"],
-                unit=row["TargetUnit"],
-                conversionfactor=row["ConversionFactor"]
+                uuid=row.TargetFlowUUID,
+                name=row.TargetFlowName,
+                category=row.TargetFlowContext,
+                unit=row.TargetUnit,
+                conversionfactor=row.ConversionFactor
             ))
-
-        log.info("indexed %i mappings for %i flows",
-                 self.__mapping.shape[0], len(map_idx))
         return map_idx
 
+    def _build_map_table(self) -> pd.DataFrame:
+        if self.__mapping is None:
+            return get_map_table(self.__system)
+        return compile_map_table(self.__mapping, self.__system)
+
     @staticmethod
     def _flow_key(uuid="", name="", category="", unit="") -> str:
         if _is_strv(uuid) and uuid != "":
@@ -205,3 +265,91 @@ class Mapper(object):
             parts.append("kg")
         parts = [p.strip().lower() for p in parts]
         return "/".join(parts)
+
+    @staticmethod
+    def _flow_keys(uuid: pd.Series, name: pd.Series, category: pd.Series,
+                   unit: pd.Series) -> pd.Series:
+        """Column version of `_flow_key`."""
+        if len(name) == 0:
+            return pd.Series([], index=name.index, dtype=object)
+        has_category = _strv_mask(category)
+        norm = norm_categories(category[has_category]).astype(object)
+        keys = name.astype(str).str.strip().str.lower()
+        keys[has_category] = keys[has_category] + "/" + norm
+        units = unit.where(_strv_mask(unit), "kg")
+        keys = keys + "/" + units.str.strip().str.lower()
+        has_uuid = _strv_mask(uuid)
+        keys[has_uuid] = uuid[has_uuid]
+        return keys
+
+
+def _strv_mask(s: pd.Series) -> pd.Series:
+    """Column version of `_is_strv`."""
+    stripped = s.astype(object).str.strip()
+    return (stripped.notna() & (stripped != "")).astype(bool)
+
+
+def compile_map_table(mapping: pd.DataFrame, system=None) -> pd.DataFrame:
+    """Return the mapping as a table of flow keys and targets.
+
+    Targets are normalized in the same way as `_FlowInfo`; the `_target`
+    column keeps the order of the targets within the mapping file.
+    :param mapping: df, mapping that meets FEDEFL mapping file specifications
+    :param system: str, if passed only mappings of that SourceListName are
+        included
+    """
+    log.debug("index flows")
+    n_mappings = mapping.shape[0]
+    if system is not None:
+        mapping = mapping[mapping['SourceListName'] == system]
+    table = pd.DataFrame({
+        'key': Mapper._flow_keys(uuid=mapping['SourceFlowUUID'],
+                                 name=mapping['SourceFlowName'],
+                                 category=mapping['SourceFlowContext'],
+                                 unit=mapping['SourceUnit']).values,
+        'TargetFlowName': mapping['TargetFlowName'].values,
+        'TargetFlowContext': mapping['TargetFlowContext'].values,
+        'TargetUnit': mapping['TargetUnit'].where(
+            _strv_mask(mapping['TargetUnit']), 'kg').values,
+        'TargetFlowUUID': mapping['TargetFlowUUID'].values,
+        'ConversionFactor': (mapping['ConversionFactor'].astype(str)
+                             .astype(float).values),
+        })
+    no_uuid = ~_strv_mask(table['TargetFlowUUID'])
+    table.loc[no_uuid, 'TargetFlowUUID'] = [
+        make_uuid(n, c, u) for n, c, u in table.loc[
+            no_uuid, ['TargetFlowName', 'TargetFlowContext',
+                      'TargetUnit']].values]
+    table['_target'] = np.arange(len(table))
+
+    log.info("indexed %i mappings for %i flows",
+             n_mappings, table['key'].nunique())
+    return table
+
+
+def get_map_table(system: str) -> pd.DataFrame:
+    """Return the compiled mapping table for a mapping system.
+
+    The table is compiled once for each version of the fedelemflowlist and
+    of the compiled tables (MAP_TABLE_VERSION) and stored as parquet in the
+    OUTPUTPATH; later calls in the same process return it from memory.
+    """
+    path = (OUTPUTPATH / 'mapping' /
+            f"{system}_v{flow_list_specs['list_version']}_"
+            f"{flow_list_specs['tool_version']}_"
+            f"c{MAP_TABLE_VERSION}.parquet")
+    table = _map_tables.get(path)
+    if table is not None:
+        return table
+    if path.is_file():
+        log.info(f"loading compiled flow mapping {system} from {path}")
+        table = pd.read_parquet(path)
+    else:
+        log.info(f"loading flow mapping {system} from fedelemflowlist")
+        table = compile_map_table(cache.get_flowmapping(source=system),
+                                  system)
+        mkdir_if_missing(path.parent)
+        table.to_parquet(path, index=False)
+        log.info(f"stored compiled flow mapping {system} to {path}")
+    _map_tables[path] = table
+    return table
@@ -5,6 +5,12 @@
 This module contains functions needed to compile LCIA methods from ImpactWorld+
 """
 
+import contextlib
+import decimal
+import os
+import sqlite3
+
+import numpy as np
 import pandas as pd
 import lciafmt
 import lciafmt.cache as cache
@@ -14,168 +20,303 @@ from lciafmt.util import log, format_cas
 try:
     import pyodbc
 except ImportError:
-    log.error("Must install pyodbc for ImpactWorld. See install instructions "
-              "for optional package installation or install it independently "
-              "and retry.")
-
-
-def get(file=None, url=None, region=None) -> pd.DataFrame:
+    pyodbc = None
+
+# name of the downloaded Access database in the cache folder
+source_file = "Impact_World.accdb"
+# name of the SQLite copy of the Access database in the cache folder
+sqlite_file = "Impact_World.sqlite"
+# number of rows fetched from a table at once
+fetch_size = 10000
+
+not_regionalized_table = "CF - not regionalized - All other impact categories"
+particulate_matter_table = "CF - regionalized - PartMatterForm - aggregated"
+# List relevant sheets in Impact World Access file. Second item in tuple
+# tells the source of compartment information. Compartment for water
+# categories are not included in access file, defined below. Elementary flow
+# names are used to define the compartment for land transformation and
+# occupation. Compartment and Subcompartment data is available in the Access
+# file for other categories.
+regional_tables = [("CF - regionalized - WaterScarc - aggregated", "Raw/in water"),
+                   ("CF - regionalized - WaterAvailab_HH - aggregated", "Raw/in water"),
+                   ("CF - regionalized - LandTrans - aggregated", "Elementary Flow"),
+                   ("CF - regionalized - LandOcc - aggregated", "Elementary Flow"),
+                   ("CF - regionalized - EutroMar - aggregated", "Compartment"),
+                   (particulate_matter_table, "Compartment"),
+                   ("CF - regionalized - AcidFW - aggregated", "Compartment"),
+                   ("CF - regionalized - AcidTerr - aggregated", "Compartment"),
+                   ("CF - regionalized - EutroFW - aggregated", "Compartment"),
+                   ]
+water_tables = ['CF - regionalized - WaterScarc - aggregated',
+                'CF - regionalized - WaterAvailab_HH - aggregated']
+# tables in which the elementary flow also defines the context
+flow_context_tables = ['CF - regionalized - LandTrans - aggregated',
+                       'CF - regionalized - LandOcc - aggregated'] + water_tables
+tables = [not_regionalized_table] + [t for t, _ in regional_tables]
+
+
+def get(file=None, url=None, region=None):
     """Generate a method for ImpactWorld+ in standard format.
 
-    :param file: str, alternate filepath for method, defaults to file stored
-        in cache
+    :param file: str, alternate filepath for method, defaults to the SQLite
+        copy of the database in the cache (see `to_sqlite`) or else the
+        Access file stored in cache
     :param url: str, alternate url for method, defaults to url in method config
-    :param region: str, 3-digit code for Region; if not specified uses Global values
-    :return: DataFrame of method in standard format
+    :param region: str, 3-digit code for Region; if not specified uses Global
+        values. A list of codes (where None is Global) generates the method
+        for each region from a single read of the database.
+    :return: DataFrame of method in standard format, or a dictionary of
+        these DataFrames by region when a list of regions is given
     """
     log.info("get method ImpactWorld+")
 
-    # Check for drivers and display help message if absent
-    driver_check = ([x for x in pyodbc.drivers()])
-    if any('Microsoft Access Driver' in word for word in driver_check):
-        log.debug("Drivers Available")
-    else:
-        log.warning(
-            "Please install drivers to remotely connect to Access Database. "
-            "Drivers only available on windows platform. For instructions visit: "
-            "https://github.com/mkleehammer/pyodbc/wiki/Connecting-to-Microsoft-Access")
     method_meta = lciafmt.Method.ImpactWorld.get_metadata()
     f = file
     if f is None:
         f = _get_file(method_meta, url)
-    df = _read(f, region)
+    regions = region if isinstance(region, (list, tuple)) else [region]
+    methods = {}
+    for reg, df in zip(regions, _select_regions(_read(f), regions)):
+        # Identify midpoint and endpoint records and differentiate in data frame.
+        end_point_units = ['DALY', 'PDF.m2.yr']
 
-    # Identify midpoint and endpoint records and differentiate in data frame.
-    end_point_units = ['DALY', 'PDF.m2.yr']
+        df.loc[df["Indicator unit"].isin(end_point_units), ["Method"]] = "ImpactWorld+ - Endpoint"
+        df.loc[~df["Indicator unit"].isin(end_point_units), ["Method"]] = "ImpactWorld+ - Midpoint"
 
-    df.loc[df["Indicator unit"].isin(end_point_units), ["Method"]] = "ImpactWorld+ - Endpoint"
-    df.loc[~df["Indicator unit"].isin(end_point_units), ["Method"]] = "ImpactWorld+ - Midpoint"
+        # call function to replace contexts for unspecified water and air flows.
+        methods[reg] = update_context(df)
 
-    # call function to replace contexts for unspecified water and air flows.
-    df = update_context(df)
-
-    return df
+    if isinstance(region, (list, tuple)):
+        return methods
+    return methods[region]
 
 def _get_file(method_meta, url=None):
-    fname = "Impact_World.accdb"
+    if url is None and cache.exists(sqlite_file):
+        log.info(f"take {sqlite_file} from cache")
+        return cache.get_path(sqlite_file)
     if url is None:
         url = method_meta['url']
-    f = cache.get_or_download(fname, url)
+    f = cache.get_or_download(source_file, url)
     return f
 
-def _read(access_file: str, region) -> pd.DataFrame:
-    """Read the Access database at passed access_file into DataFrame."""
-    log.info(f"read ImpactWorld+ from file {access_file}")
 
-    path = cache.get_path(access_file)
+def _is_sqlite(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(16) == b"SQLite format 3\x00"
 
+
+def _connect(path: str):
+    """Open a DB-API connection to the ImpactWorld+ database in the given
+    file, which is either a SQLite copy or the original Access file."""
+    if _is_sqlite(path):
+        return sqlite3.connect(path)
+    if pyodbc is None:
+        raise ImportError(
+            "Must install pyodbc for ImpactWorld. See install instructions "
+            "for optional package installation or install it independently "
+            "and retry.")
+    # Check for drivers and display help message if absent
+    driver_check = ([x for x in pyodbc.drivers()])
+    if any('Microsoft Access Driver' in word for word in driver_check):
+        log.debug("Drivers Available")
+    else:
+        log.warning(
+            "Please install drivers to remotely connect to Access Database. "
+            "Drivers only available on windows platform. For instructions visit: "
+            "https://github.com/mkleehammer/pyodbc/wiki/Connecting-to-Microsoft-Access")
     connStr = (
         r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
         r'DBQ=' + path + ";")
+    return pyodbc.connect(connStr)
+
 
-    cnxn = pyodbc.connect(connStr)
+def _query(cnxn, sql: str) -> pd.DataFrame:
+    """Run the query and return its result with one object column per
+    column of the result set; the rows are fetched in batches."""
     crsr = cnxn.cursor()
-    records = []
-
-    # Extract non regionalized data from "CF - not regionalized - All other impact categories"
-    crsr.execute("SELECT * FROM [CF - not regionalized - All other impact categories]")
-    rows = crsr.fetchall()
-    for row in rows:
-        dfutil.record(records,
-                      method="ImpactWorld+",
-                      indicator=row[1],
-                      indicator_unit=row[2],
-                      flow=row[5],
-                      flow_category=row[3] + "/" + row[4],
-                      flow_unit=row[8],
-                      cas_number=format_cas(row[6]).lstrip("0"),
-                      location='Global',
-                      factor=row[7])
-
-    """List relevant sheets in Impact World Access file. Second item in tuple
-    tells the source of compartment information. Compartment for water
-    categories are not included in access file, defined below. Elementary flow
-    names are used to define the compartment for land transformation and
-    occupation. Compartment and Subcompartment data is available in the Access
-    file for other categories."""
-    regional_sheets = [("CF - regionalized - WaterScarc - aggregated", "Raw/in water"),
-                       ("CF - regionalized - WaterAvailab_HH - aggregated", "Raw/in water"),
-                       ("CF - regionalized - LandTrans - aggregated", "Elementary Flow"),
-                       ("CF - regionalized - LandOcc - aggregated", "Elementary Flow"),
-                       ("CF - regionalized - EutroMar - aggregated", "Compartment"),
-                       ("CF - regionalized - PartMatterForm - aggregated", "Compartment"),
-                       ("CF - regionalized - AcidFW - aggregated", "Compartment"),
-                       ("CF - regionalized - AcidTerr - aggregated", "Compartment"),
-                       ("CF - regionalized - EutroFW - aggregated", "Compartment"),
-                       ]
-
-    for sheet, compartment in regional_sheets:
-        if sheet == "CF - regionalized - PartMatterForm - aggregated":
-            # Extract global flows from the particulate matter Access sheet
-
-            region_dict = {
-                'USA': 'US+Latin America',
-                }
-            reg = region_dict.get(region, 'World')
-            sql = f"SELECT * FROM [{sheet}] WHERE (([{sheet}].Region In('{reg}')))"
-            crsr.execute(sql)
-            rows = crsr.fetchall()
-
-            for row in rows:
-                dfutil.record(records,
-                              method="ImpactWorld+",
-                              indicator=row.ImpCat,
-                              indicator_unit=row.Unit.strip('[]').split('/')[0],
-                              flow=row.__getattribute__('Elem flow'),
-                              flow_category="Air/" + row.__getattribute__("Archetype 1"),
-                              flow_unit=row.Unit.strip('[]').split('/')[1],
-                              cas_number="",
-                              location=reg,
-                              factor=row.CFvalue)
-
-        else:
-            reg = region if region else 'GLO'
-            sql = (f"SELECT * FROM [{sheet}] WHERE "
-                   f"(([{sheet}].[Region code] In('{reg}')) OR "
-                   f"([{sheet}].Resolution In('Not regionalized')))")
-            # ^^ 'Not regionalized' applies in all cases
-            crsr.execute(sql)
-            rows = crsr.fetchall()
-
-            # extract column headers from Access sheet for exception testing
-            cols = [column[0] for column in crsr.description]
-
-            for row in rows:
-                # Add water to detailed context information available in Access file
-                if sheet in ['CF - regionalized - WaterScarc - aggregated',
-                            'CF - regionalized - WaterAvailab_HH - aggregated']:
-                    flow_stmt = 'Water, ' + row.__getattribute__('Elem flow')
-                else:
-                    flow_stmt = row.__getattribute__('Elem flow')
-
-                # Define context/compartment for flow based on impact category.
-                if {'Compartment', 'Subcompartment'}.issubset(cols):
-                    category_stmt = f"{row.Compartment}/{row.Subcompartment}"
-                elif sheet in ['CF - regionalized - LandTrans - aggregated',
-                               'CF - regionalized - LandOcc - aggregated',
-                               'CF - regionalized - WaterScarc - aggregated',
-                               'CF - regionalized - WaterAvailab_HH - aggregated']:
-                    category_stmt = flow_stmt
-                else:
-                    category_stmt = compartment
-
-                dfutil.record(records,
-                              method="ImpactWorld+",
-                              indicator=row.ImpCat,
-                              indicator_unit=row.Unit.strip('[]').split('/')[0],
-                              flow=flow_stmt,
-                              flow_category=category_stmt,
-                              flow_unit=row.Unit.strip('[]').split('/')[1],
-                              cas_number="",
-                              location=reg,
-                              factor=row.__getattribute__('Weighted Average'))
-
-    return dfutil.data_frame(records)
+    crsr.execute(sql)
+    names = [column[0] for column in crsr.description]
+    columns = [[] for _ in names]
+    while rows := crsr.fetchmany(fetch_size):
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+    crsr.close()
+    df = pd.DataFrame({i: np.array(column, dtype=object)
+                       for i, column in enumerate(columns)})
+    df.columns = names
+    return df
+
+
+def to_sqlite(access_file: str, file=None) -> str:
+    """Copy the tables of the ImpactWorld+ Access database that are used for
+    the method into a SQLite file. This requires pyodbc and the Access driver
+    once; the SQLite file can then be read on any platform. By default it is
+    written to the cache folder, where `get` takes it in place of the Access
+    file.
+
+    :param access_file: str, path of the Access database
+    :param file: str, path of the SQLite file to write
+    :return: str, path of the SQLite file
+    """
+    if file is None:
+        cache.get_folder(create=True)
+        file = cache.get_path(sqlite_file)
+    log.info(f"copy ImpactWorld+ tables from {access_file} to {file}")
+    tmp = file + ".tmp"
+    if os.path.isfile(tmp):
+        os.remove(tmp)
+    with contextlib.closing(_connect(access_file)) as src, \
+            contextlib.closing(sqlite3.connect(tmp)) as dst:
+        for table in tables:
+            crsr = src.cursor()
+            crsr.execute(f"SELECT * FROM [{table}]")
+            # no column types, values keep their type; text is compared
+            # case-insensitively as in Access
+            columns = ", ".join(f"[{column[0]}] COLLATE NOCASE"
+                                for column in crsr.description)
+            dst.execute(f"CREATE TABLE [{table}] ({columns})")
+            insert = (f"INSERT INTO [{table}] VALUES "
+                      f"({', '.join('?' * len(crsr.description))})")
+            while rows := crsr.fetchmany(fetch_size):
+                dst.executemany(insert, (
+                    [float(v) if isinstance(v, decimal.Decimal) else v
+                     for v in row] for row in rows))
+            crsr.close()
+        dst.commit()
+    os.replace(tmp, file)
+    return file
+
+
+@cache.parsed(version=3)
+def _read(access_file: str) -> pd.DataFrame:
+    """Read the ImpactWorld+ database at passed access_file into DataFrame.
+    The factors of all regions are read; besides the standard columns, the
+    frame has the index of the source table in `tables` and the Region and
+    Resolution of each factor, from which `_select_regions` takes the
+    factors of a region."""
+    log.info(f"read ImpactWorld+ from file {access_file}")
+
+    path = cache.get_path(access_file)
+    with contextlib.closing(_connect(path)) as cnxn:
+        frames = [_read_not_regionalized(cnxn)]
+        for table, compartment in regional_tables:
+            if table == particulate_matter_table:
+                frames.append(_read_particulate_matter(cnxn))
+            else:
+                frames.append(_read_regionalized(cnxn, table, compartment))
+    for i, frame in enumerate(frames):
+        frame['Table'] = i
+    return pd.concat(frames, ignore_index=True)
+
+
+def _select_regions(df: pd.DataFrame, regions: list) -> list:
+    """Take the factors of each of the regions from the frame returned by
+    `_read` and set their location. As in Access, region codes are compared
+    case-insensitively."""
+    table = df['Table'].to_numpy()
+    not_regionalized = table == tables.index(not_regionalized_table)
+    particulate_matter = table == tables.index(particulate_matter_table)
+    regionalized = ~(not_regionalized | particulate_matter)
+    key = df['Region'].str.casefold().to_numpy()
+    # 'Not regionalized' applies in all cases
+    every_region = (df['Resolution'].str.casefold() ==
+                    'not regionalized').to_numpy()
+    region_dict = {
+        'USA': 'US+Latin America',
+        }
+
+    frames = []
+    for region in regions:
+        reg = region if region else 'GLO'
+        pm_reg = region_dict.get(region, 'World')
+        mask = (not_regionalized |
+                (particulate_matter & (key == pm_reg.casefold())) |
+                (regionalized & ((key == reg.casefold()) | every_region)))
+        frame = df.loc[mask, dfutil.lciafmt_cols].reset_index(drop=True)
+        frame['Location'] = np.where(
+            not_regionalized[mask], 'Global',
+            np.where(particulate_matter[mask], pm_reg, reg)).astype(object)
+        frames.append(frame)
+    return frames
+
+
+def _read_not_regionalized(cnxn) -> pd.DataFrame:
+    """Extract non regionalized data from "CF - not regionalized - All other
+    impact categories"."""
+    df = _query(cnxn, f"SELECT * FROM [{not_regionalized_table}]")
+    col = [df.iloc[:, i] for i in range(df.shape[1])]
+    frame = dfutil.from_columns(
+        len(df),
+        method="ImpactWorld+",
+        indicator=col[1].to_numpy(),
+        indicator_unit=col[2].to_numpy(),
+        flow=col[5].to_numpy(),
+        flow_category=(col[3] + "/" + col[4]).to_numpy(),
+        flow_unit=col[8].to_numpy(),
+        cas_number=[format_cas(cas).lstrip("0") for cas in col[6]],
+        factor=col[7].to_numpy(dtype=float))
+    frame['Region'] = None
+    frame['Resolution'] = None
+    return frame
+
+
+def _units(df: pd.DataFrame):
+    """Split the `[indicator unit/flow unit]` values of the Unit column."""
+    units = df['Unit'].str.strip('[]').str.split('/')
+    return units.str[0].to_numpy(), units.str[1].to_numpy()
+
+
+def _read_particulate_matter(cnxn) -> pd.DataFrame:
+    """Extract the flows from the particulate matter table."""
+    df = _query(cnxn, f"SELECT * FROM [{particulate_matter_table}]")
+    indicator_unit, flow_unit = _units(df)
+    frame = dfutil.from_columns(
+        len(df),
+        method="ImpactWorld+",
+        indicator=df['ImpCat'].to_numpy(),
+        indicator_unit=indicator_unit,
+        flow=df['Elem flow'].to_numpy(),
+        flow_category=("Air/" + df['Archetype 1']).to_numpy(),
+        flow_unit=flow_unit,
+        cas_number="",
+        factor=df['CFvalue'].to_numpy(dtype=float))
+    frame['Region'] = df['Region'].to_numpy()
+    frame['Resolution'] = None
+    return frame
+
+
+def _read_regionalized(cnxn, table: str, compartment: str) -> pd.DataFrame:
+    """Extract the factors of a regionalized table."""
+    df = _query(cnxn, f"SELECT * FROM [{table}]")
+
+    # Add water to detailed context information available in Access file
+    flow = df['Elem flow']
+    if table in water_tables:
+        flow = 'Water, ' + flow
+
+    # Define context/compartment for flow based on impact category.
+    if {'Compartment', 'Subcompartment'}.issubset(df.columns):
+        category = (df['Compartment'].astype(str) + "/" +
+                    df['Subcompartment'].astype(str)).to_numpy()
+    elif table in flow_context_tables:
+        category = flow.to_numpy()
+    else:
+        category = compartment
+
+    indicator_unit, flow_unit = _units(df)
+    frame = dfutil.from_columns(
+        len(df),
+        method="ImpactWorld+",
+        indicator=df['ImpCat'].to_numpy(),
+        indicator_unit=indicator_unit,
+        flow=flow.to_numpy(),
+        flow_category=category,
+        flow_unit=flow_unit,
+        cas_number="",
+        factor=df['Weighted Average'].to_numpy(dtype=float))
+    frame['Region'] = df['Region code'].to_numpy()
+    frame['Resolution'] = df['Resolution'].to_numpy()
+    return frame
 
 
 def update_context(df_context) -> pd.DataFrame:
@@ -5,12 +5,16 @@
 Functions to support generating JSONLD files for lciafmt
 """
 
-from typing import Optional
+import json
+import math
+import zipfile
+from collections.abc import Mapping
+from typing import Iterable, Optional, Union
+import numpy as np
 import pandas as pd
 try:
     import olca_schema as o
     import olca_schema.units as units
-    import olca_schema.zipio as zipio
 except ImportError:
     raise ImportError("lciafmt now requires olca-schema to align with "
                       "openLCA v2.0. Use pip install olca-schema")
@@ -19,6 +23,7 @@ from esupy.util import make_uuid
 from esupy.bibtex import generate_sources
 from esupy.location import extract_coordinates, olca_location_meta
 import fedelemflowlist
+import lciafmt.cache as cache
 from .util import is_non_empty_str, generate_method_description,\
     log, pkg_version_number, datapath, check_as_class
 
@@ -27,16 +32,29 @@ class Writer(object):
 
     def __init__(self, zip_file: str):
         log.debug(f"create JSON-LD writer on {zip_file}")
-        self.__writer = zipio.ZipWriter(zip_file)
+        self.__writer = _ZipWriter(zip_file)
         self.__methods = {}
         self.__indicators = {}
+        # rendered impact factors of the indicators written in fast mode
+        self.__factors = {}
+        # uids of indicators that were already written in stream mode
+        self.__written = set()
+        self.__current = None
         self.__flows = {}
-        self.__coordinates = {}
+        self.__regions = None
+        self.__coordinates = None
         self.__locations = {}
-        self.__location_meta = olca_location_meta().fillna('')
+        # location metadata by code, the first entry is used for a code
+        self.__location_meta = (olca_location_meta().fillna('')
+                                .drop_duplicates(subset='Code')
+                                .set_index('Code', drop=False)
+                                .to_dict('index'))
         self.__sources = {}
+        self.__source_index = {}
+        self.__source_lengths = []
         self.__sources_to_write = {}
         self.__bibids = {}
+        self.__indexed_bibids = None
         self.__bibpath = datapath / 'lcia.bib'
 
     def __enter__(self):
@@ -45,14 +63,54 @@ class Writer(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.__writer.close()
 
-    def write(self, df: pd.DataFrame,
+    def write(self, df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
               write_flows=False,
               preferred_only=False,
-              regions=None # list, options include: 'states', 'countries'
+              regions=None, # list, options include: 'states', 'countries'
+              stream=False,
+              fast=False
               ):
+        """Write the methods to the zip file.
+
+        :param df: DataFrame of methods, or an iterable of DataFrames (chunks)
+        :param stream: bool, if True each indicator is written to the zip
+            file as soon as its factors are complete and then released from
+            memory; requires the factors to be sorted by indicator
+        :param fast: bool, if True the impact factors are serialized directly
+            from pre-rendered JSON fragments instead of olca-schema objects
+        """
+        frames = [df] if isinstance(df, pd.DataFrame) else df
+        for frame in frames:
+            self.__write_factors(frame, regions, stream, fast)
+        if stream:
+            self.__flush_indicator()
+
+        log.debug("write entities")
+        dicts = [
+            self.__methods,
+            self.__locations,
+            self.__sources_to_write
+        ]
+        if write_flows:
+            log.info("writing flows from the fedelemflowlist ...")
+            flowlist = cache.get_flows(preferred_only=preferred_only)
+            flow_dict = self.__flows
+            flows = flowlist.query('`Flow UUID` in @flow_dict.keys()')
+            if preferred_only:
+                log.info("writing only preferred flows ...")
+            elif len(flows) != len(flow_dict):
+                log.warning("not all flows written...")
+            fedelemflowlist.write_jsonld(flows, path=None,
+                                         zw = self.__writer)
+        for uid, ind in self.__indicators.items():
+            self.__write_indicator(uid, ind)
+        for d in dicts:
+            for v in d.values():
+                self.__writer.write(v)
+
+    def __write_factors(self, df: pd.DataFrame, regions, stream, fast):
         if any(df['Location'] != '') and regions is not None:
-            coord = [extract_coordinates(group=r) for r in regions]
-            self.__coordinates = {k: v for d in coord for k, v in d.items()}
+            self.__regions = regions
         if 'source_method' not in df:
             df['source_method'] = df['Method']
         if 'source_indicator' not in df:
@@ -62,8 +120,6 @@ class Writer(object):
 
         methods = pd.unique(
                 df[['Method', 'source_method']].values.ravel('K'))
-        indicators = pd.unique(
-                df[['Indicator', 'source_indicator']].values.ravel('K'))
 
         # identify all relevant bib_ids and sources
         for method in methods:
@@ -75,54 +131,97 @@ class Writer(object):
             if bib:
                 if isinstance(bib, str):
                     self.__bibids[bib] = m.value
-                elif isinstance(bib, dict):
+                elif isinstance(bib, Mapping):
                     for k,v in bib.items():
                         self.__bibids[v] = f'{m.value} {k}'
-        for i in generate_sources(self.__bibpath, self.__bibids):
-            self.__sources[i.id] = i
-
-        for _, row in df.iterrows():
-            indicator = self.__indicator(row)
-            factor = o.ImpactFactor()
-            unit = row['Unit']
-            factor.flow = self.__flow(row).to_ref()
-            factor.flow_property = units.property_ref(unit)
-            factor.unit = units.unit_ref(unit)
-            factor.value = row['Characterization Factor']
-            if self.__coordinates != {}:
-                location = self.__location(row)
-                factor.location = location.to_ref() if location else None
-            indicator.impact_factors.append(factor)
+        if self.__indexed_bibids != len(self.__bibids):
+            self.__indexed_bibids = len(self.__bibids)
+            for i in generate_sources(self.__bibpath, self.__bibids):
+                self.__sources[i.id] = i
+            # index the sources by name; earlier sources take precedence
+            self.__source_index = {}
+            for order, source in enumerate(self.__sources.values()):
+                if isinstance(source.name, str):
+                    self.__source_index.setdefault(source.name,
+                                                   (order, source))
+            self.__source_lengths = sorted(
+                {len(n) for n in self.__source_index})
 
-        log.debug("write entities")
-        dicts = [
-            self.__indicators,
-            self.__methods,
-            self.__locations,
-            self.__sources_to_write
-        ]
-        if write_flows:
-            log.info("writing flows from the fedelemflowlist ...")
-            flowlist = fedelemflowlist.get_flows(preferred_only)
-            flow_dict = self.__flows
-            flows = flowlist.query('`Flow UUID` in @flow_dict.keys()')
-            if preferred_only:
-                log.info("writing only preferred flows ...")
-            elif len(flows) != len(flow_dict):
-                log.warning("not all flows written...")
-            fedelemflowlist.write_jsonld(flows, path=None,
-                                         zw = self.__writer)
-        for d in dicts:
-            for v in d.values():
-                self.__writer.write(v)
+        indicator_uids = _uids(df, 'Indicator UUID', ['category', 'Indicator'])
+        flow_uids = _uids(df, 'Flow UUID', ['Flowable', 'Context', 'Unit'])
 
-    def __indicator(self, row) -> o.ImpactCategory:
-        uid = row['Indicator UUID']
-        if not is_non_empty_str(uid):
-            uid = make_uuid(row['category'], row['Indicator'])
+        # resolve flows, units and locations once per distinct value
+        flow_refs = {}
+        for uid, i in _first_rows(flow_uids):
+            flow_refs[uid] = self.__flow(df.iloc[i], uid).to_ref()
+        unit_refs = {u: (units.property_ref(u), units.unit_ref(u))
+                     for u in pd.unique(df['Unit'])}
+        location_refs = {}
+        if self.__regions is not None:
+            for code in pd.unique(df['Location']):
+                location = self.__location(code)
+                location_refs[code] = location.to_ref() if location else None
+
+        flows = flow_uids.tolist()
+        unit_list = df['Unit'].tolist()
+        locations = df['Location'].tolist()
+        values = df['Characterization Factor'].tolist()
+        if fast:
+            # pre-render the JSON fragments of the factors
+            flow_refs = {k: _fragment(v) for k, v in flow_refs.items()}
+            unit_refs = {k: (_fragment(v[0]), _fragment(v[1]))
+                         for k, v in unit_refs.items()}
+            location_refs = {k: _fragment(v)
+                             for k, v in location_refs.items()}
+            values = [_number(v) for v in values]
+        groups = indicator_uids.groupby(indicator_uids, sort=False).indices
+        for uid, i in _first_rows(indicator_uids):
+            if stream and uid != self.__current:
+                self.__flush_indicator()
+                self.__current = uid
+            indicator = self.__indicator(df.iloc[i], uid)
+            if fast:
+                self.__factors.setdefault(uid, []).extend(
+                    _factor_json(flow=flow_refs[flows[j]],
+                                 flow_property=unit_refs[unit_list[j]][0],
+                                 unit=unit_refs[unit_list[j]][1],
+                                 value=values[j],
+                                 location=location_refs.get(locations[j]))
+                    for j in groups[uid])
+                continue
+            indicator.impact_factors.extend(
+                o.ImpactFactor(flow=flow_refs[flows[j]],
+                               flow_property=unit_refs[unit_list[j]][0],
+                               unit=unit_refs[unit_list[j]][1],
+                               value=values[j],
+                               location=location_refs.get(locations[j]))
+                for j in groups[uid])
+
+    def __flush_indicator(self):
+        """Write the current indicator of a stream and release it."""
+        ind = self.__indicators.pop(self.__current, None)
+        if ind is None:
+            return
+        log.debug("write indicator %s", ind.name)
+        self.__write_indicator(self.__current, ind)
+        self.__written.add(self.__current)
+        self.__current = None
+
+    def __write_indicator(self, uid, ind: o.ImpactCategory):
+        factors = self.__factors.pop(uid, None)
+        if factors is None:
+            self.__writer.write(ind)
+        else:
+            self.__writer.write_json(ind, _category_json(ind, factors))
+
+    def __indicator(self, row, uid) -> o.ImpactCategory:
         ind = self.__indicators.get(uid)
         if ind is not None:
             return ind
+        if uid in self.__written:
+            raise ValueError(f"factors of indicator {row['Indicator']} are "
+                             "not contiguous; sort the input by indicator "
+                             "to stream it")
         log.info("writing %s indicator ...", row['Indicator'])
         ind = o.ImpactCategory()
         ind.id = uid
@@ -174,11 +273,7 @@ class Writer(object):
         self.__methods[uid] = m
         return m
 
-    def __flow(self, row):
-        uid = row['Flow UUID']
-        if not is_non_empty_str(uid):
-            uid = make_uuid(row['Flowable'], row['Context'], row['Unit'])
-
+    def __flow(self, row, uid):
         flow = self.__flows.get(uid)
         if flow is not None:
             return flow
@@ -206,33 +301,154 @@ class Writer(object):
         self.__flows[uid] = flow
         return flow
 
-    def __location(self, row):
-        if row['Location'] == '':
+    def __location(self, code):
+        if code == '':
             # no location specified
             return None
-        meta = (self.__location_meta.loc[
-            self.__location_meta['Code'] == row['Location']].squeeze())
-        if len(meta) == 0:
+        meta = self.__location_meta.get(code)
+        if meta is None:
             # not an available location
             return None
-        location = self.__locations.get(meta.ID)
+        location = self.__locations.get(meta['ID'])
         if location is not None:
             # location found, no need to regenerate
             return location
         location = o.Location(
-            id=meta.ID,
-            name=meta.Name,
-            description=meta.Description,
-            category=meta.Category,
-            code=meta.Code,
-            geometry=self.__coordinates.get(row['Location'], {}).get('geometry'),
-            latitude=meta.Latitude,
-            longitude=meta.Longitude)
-        self.__locations[meta.ID] = location
+            id=meta['ID'],
+            name=meta['Name'],
+            description=meta['Description'],
+            category=meta['Category'],
+            code=meta['Code'],
+            geometry=self.__geometry(code),
+            latitude=meta['Latitude'],
+            longitude=meta['Longitude'])
+        self.__locations[meta['ID']] = location
         return location
 
+    def __geometry(self, code):
+        # coordinates are only extracted once a location is referenced
+        if self.__coordinates is None:
+            coord = [extract_coordinates(group=r) for r in self.__regions]
+            self.__coordinates = {k: v for d in coord for k, v in d.items()}
+        return self.__coordinates.get(code, {}).get('geometry')
+
     def _return_source(self, name):
-        for uid, s in self.__sources.items():
-            if s.name == name or name.startswith(s.name):
-                return s
+        # the first source whose name is a prefix of (or equal to) name
+        matches = [self.__source_index.get(name[:n])
+                   for n in self.__source_lengths if n <= len(name)]
+        matches = [m for m in matches if m is not None]
+        if not matches:
+            return None
+        return min(matches, key=lambda m: m[0])[1]
+
+
+def _uids(df: pd.DataFrame, uid_col: str, name_cols: list) -> pd.Series:
+    """Return the UUIDs in uid_col; missing UUIDs are generated from the
+    values in name_cols."""
+    uids = df[uid_col].astype(object)
+    missing = ~uids.map(is_non_empty_str).astype(bool)
+    if missing.any():
+        names = list(df.loc[missing, name_cols].itertuples(index=False,
+                                                           name=None))
+        made = {n: make_uuid(*n) for n in set(names)}
+        uids = uids.copy()
+        uids[missing] = [made[n] for n in names]
+    return uids
+
+
+def _first_rows(s: pd.Series):
+    """Return pairs of each distinct value of s and the position of its
+    first row."""
+    first = ~s.duplicated().values
+    return zip(s[first].tolist(), np.flatnonzero(first))
+
+
+# the folders of the root entities in a zip file of olca-schema, by type
+_folders = {
+    'Actor': 'actors',
+    'Currency': 'currencies',
+    'DQSystem': 'dq_systems',
+    'Epd': 'epds',
+    'Flow': 'flows',
+    'FlowProperty': 'flow_properties',
+    'ImpactCategory': 'lcia_categories',
+    'ImpactMethod': 'lcia_methods',
+    'Location': 'locations',
+    'Parameter': 'parameters',
+    'Process': 'processes',
+    'ProductSystem': 'product_systems',
+    'Project': 'projects',
+    'Result': 'results',
+    'SocialIndicator': 'social_indicators',
+    'Source': 'sources',
+    'UnitGroup': 'unit_groups'}
+
+
+class _ZipWriter(object):
+    """Writes root entities to a zip file in the layout of the olca-schema
+    ZipWriter, and also entities that are already rendered as JSON."""
+
+    def __init__(self, path: str):
+        self.__zip = zipfile.ZipFile(path, mode="a",
+                                     compression=zipfile.ZIP_DEFLATED)
+        if "olca-schema.json" not in self.__zip.namelist():
+            self.__zip.writestr("olca-schema.json", '{"version": 2}')
+
+    def close(self):
+        self.__zip.close()
+
+    def write(self, entity: o.RootEntity):
+        self.write_json(entity, entity.to_json())
+
+    def write_json(self, entity: o.RootEntity, text: str):
+        """Write the given JSON text as the file of the entity."""
+        if entity.id is None or entity.id == "":
+            raise ValueError("entity must have an ID")
+        folder = _folders.get(type(entity).__name__)
+        if folder is None:
+            raise ValueError(f"not a known root entity type: {type(entity)}")
+        self.__zip.writestr(f"{folder}/{entity.id}.json", text)
+
+
+def _category_json(category: o.ImpactCategory, factors: list) -> str:
+    """Render an impact category with the given rendered impact factors as
+    JSON, in the layout of olca-schema (`json.dumps(..., indent=2)`)."""
+    fields = []
+    for key, value in category.to_dict().items():
+        if key == 'impactFactors':
+            text = ('[\n    ' + ',\n    '.join(factors) + '\n  ]'
+                    if factors else '[]')
+        else:
+            text = json.dumps(value, indent=2).replace('\n', '\n  ')
+        fields.append(f'  {json.dumps(key)}: {text}')
+    return '{\n' + ',\n'.join(fields) + '\n}'
+
+
+def _fragment(ref: Optional[o.Ref]) -> Optional[str]:
+    """Render a reference as JSON at the indentation of an impact factor
+    field."""
+    if ref is None:
         return None
+    return json.dumps(ref.to_dict(), indent=2).replace('\n', '\n      ')
+
+
+def _number(value) -> Optional[str]:
+    """Render a factor value as JSON; None remains None."""
+    if value is None:
+        return None
+    if type(value) is float and math.isfinite(value):
+        # as json.dumps renders floats
+        return float.__repr__(value)
+    return json.dumps(value)
+
+
+def _factor_json(flow=None, flow_property=None, location=None, unit=None,
+                 value=None) -> str:
+    """Render an impact factor from JSON fragments in the field order of
+    olca_schema.ImpactFactor.to_dict."""
+    fields = [('flow', flow), ('flowProperty', flow_property),
+              ('location', location), ('unit', unit), ('value', value)]
+    return ('{\n      ' +
+            ',\n      '.join(f'"{k}": {v}' for k, v in fields
+                              if v is not None) +
+            '\n    }')
@@ -6,6 +6,10 @@ This module contains functions needed to compile LCIA methods from the
 ReCiPe model
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import openpyxl
 
@@ -15,7 +19,7 @@ import lciafmt.df as dfutil
 import lciafmt.xls as xls
 
 from .util import datapath, aggregate_factors_for_primary_contexts, log,\
-        format_cas
+        format_cas, curate_flowables, group_key
 
 
 contexts = {
@@ -36,20 +40,38 @@ contexts = {
         'Sea water': 'water/sea water',
         'marine water': 'water/sea water'}
 flowables_split = pd.read_csv(datapath / 'ReCiPe2016_split.csv')
+flowables_split['CAS'] = [format_cas(c)
+                          for c in flowables_split['CAS'].tolist()]
+# name of the downloaded workbook in the cache folder
+source_file = "recipe_2016.xlsx"
+
+# Factors are kept in one column per perspective, with NaN where a factor
+# does not exist for a perspective, until the method is returned in the
+# standard format with one row per perspective and factor.
+perspectives = ["I", "H", "E"]
+conversions = ["EndpointConversion/" + p for p in perspectives]
+midpoint_method = "ReCiPe 2016 - Midpoint"
+endpoint_method = "ReCiPe 2016 - Endpoint"
 
 
 def get(add_factors_for_missing_contexts=True, endpoint=True,
-        summary=False, file=None, url=None) -> pd.DataFrame:
+        summary=False, file=None, url=None, parallel=False,
+        workers=None) -> pd.DataFrame:
     """Generate a method for ReCiPe 2016 in standard format.
 
     :param add_factors_for_missing_contexts: bool, if True generates average
         factors for unspecified contexts
     :param endpoint: bool, if True generates endpoint indicators from midpoints
     :param summary: bool, if True aggregates endpoint methods into
-        summary indicators
+        summary indicators; the endpoint indicators are then generated
+        regardless of endpoint
     :param file: str, alternate filepath for method, defaults to file stored
         in cache
     :param url: str, alternate url for method, defaults to url in method config
+    :param parallel: bool, if True reads the sheets of the workbook in a
+        pool of processes
+    :param workers: int, number of processes for a parallel read, defaults
+        to the number of CPUs
     :return: DataFrame of method in standard format
     """
     log.info("getting method ReCiPe 2016")
@@ -57,66 +79,36 @@ def get(add_factors_for_missing_contexts=True, endpoint=True,
     f = file
     if f is None:
         f = _get_file(method_meta, url)
-    df = _read(f)
+    df, endpoint_df, endpoint_df_by_flow = _read(f, parallel=parallel,
+                                                 workers=workers)
     if add_factors_for_missing_contexts:
         log.info("adding average factors for primary contexts")
-        df = aggregate_factors_for_primary_contexts(df)
-
-    if endpoint:
-        endpoint_df, endpoint_df_by_flow = _read_endpoints(f)
+        df = aggregate_factors_for_primary_contexts(
+            df, factor_columns=perspectives)
+
+    # To append endpoint categories to exisiting endpointLCIA,
+    # set append = True, otherwise replaces endpoint LCIA
+    append = False
+    # the midpoint factors are not needed for the summary
+    frames = [df] if not summary or append else []
+    if endpoint or summary:
         log.info("converting midpoints to endpoints")
-        # first assesses endpoint factors that are specific to flowables
-        flowdf = df.merge(endpoint_df_by_flow, how="inner",
-                          on=["Method", "Flowable"])
-        flowdf.rename(columns={'Indicator_x': 'Indicator',
-                               'Indicator_y': 'EndpointIndicator'},
-                      inplace=True)
-        # next apply endpoint factors by indicator
-        df2 = df.merge(endpoint_df, how="inner", on=["Method", "Indicator"])
-        df2 = pd.concat([df2, flowdf], ignore_index=True, sort=False)
-        # reformat dataframe and apply conversion
-        df2['Characterization Factor'] = df2['Characterization Factor'] * df2['EndpointConversion']
-        # in the case of fossil resource scarcity, EndpointConversion factors are the actual Endpoint Characterization factors
-        fossil_exception = endpoint_df_by_flow['Flowable'].values
-        df2.loc[df2['Flowable'].isin(fossil_exception),'Characterization Factor'] = df2.loc[df2['Flowable'].isin(fossil_exception),'EndpointConversion']
-
-        df2['Method'] = df2['EndpointMethod']
-        df2['Indicator'] = df2['EndpointIndicator']
-        df2['Indicator unit'] = df2['EndpointUnit']
-        df2.drop(columns=['EndpointMethod', 'EndpointIndicator',
-                          'EndpointUnit', 'EndpointConversion'],
-                 inplace=True)
-        df = pd.concat([df, df2], ignore_index=True, sort=False)
+        frames.append(_endpoints(df, endpoint_df, endpoint_df_by_flow))
+    df = (pd.concat(frames, ignore_index=True, sort=False)
+          if len(frames) > 1 else frames[0])
 
     log.info("handling manual replacements")
     """due to substances listed more than once with the same name but
     different CAS, this replaces all instances of the Original Flowable with
     a New Flowable based on a csv input file according to the CAS"""
-    for index, row in flowables_split.iterrows():
-        newCAS = format_cas(row['CAS'])
-        newFlow = row['New Flowable']
-        df.loc[df['CAS No'] == newCAS, 'Flowable'] = newFlow
-
-    length = len(df)
-    df.drop_duplicates(keep='first', inplace=True)
-    length = length - len(df)
+    df = curate_flowables(df, splits=flowables_split)
+
+    df, length = _drop_duplicates(df)
     log.info(f"{length} duplicate entries removed")
 
     if summary:
         log.info("summarizing endpoint categories")
-        endpoint_categories = df.groupby(['Method', 'Method UUID',
-                                          'Indicator unit', 'Flowable',
-                                          'Flow UUID', 'Context', 'Unit',
-                                          'CAS No', 'Location',
-                                          'Location UUID', 'EndpointCategory'],
-                                         as_index=False)['Characterization Factor'].sum()
-        endpoint_categories['Indicator'] = endpoint_categories['EndpointCategory']
-        endpoint_categories['Indicator UUID'] = ""
-        endpoint_categories.drop(columns=['EndpointCategory'], inplace=True)
-
-        # To append endpoint categories to exisiting endpointLCIA,
-        # set append = True, otherwise replaces endpoint LCIA
-        append = False
+        endpoint_categories = _summarize(df)
         if append:
             log.info("appending endpoint categories")
             df = pd.concat([df, endpoint_categories], sort=False)
@@ -128,63 +120,202 @@ def get(add_factors_for_missing_contexts=True, endpoint=True,
         df = df.reindex(columns=["Method", "Method UUID", "Indicator",
                                  "Indicator UUID", "Indicator unit", "Flowable",
                                  "Flow UUID", "Context", "Unit", "CAS No",
-                                 "Location", "Location UUID",
-                                 "Characterization Factor"])
-    return df
+                                 "Location", "Location UUID"] + perspectives)
+        # the groups are sorted by method in the standard format
+        return (_to_long(df).sort_values('Method', kind='stable')
+                .reset_index(drop=True))
+    return _to_long(df)
+
+
+def _endpoints(df: pd.DataFrame, endpoint_df: pd.DataFrame,
+               endpoint_df_by_flow: pd.DataFrame) -> pd.DataFrame:
+    """Converts the midpoint factors to endpoint factors, first with the
+    endpoint conversion factors by indicator, then with those that are
+    specific to flowables."""
+    by_indicator = _join(df, endpoint_df, ["Method", "Indicator"])
+    by_flow = _join(df, endpoint_df_by_flow, ["Method", "Flowable"])
+    rows = np.concatenate([by_indicator[0], by_flow[0]])
+    ends = pd.concat([endpoint_df.iloc[by_indicator[1]],
+                      endpoint_df_by_flow.iloc[by_flow[1]]],
+                     ignore_index=True, sort=False)
+
+    df2 = df.iloc[rows].reset_index(drop=True)
+    midpoints = df2[perspectives].to_numpy(dtype=float)
+    conversion = ends[conversions].to_numpy(dtype=float)
+    factors = midpoints * conversion
+    # in the case of fossil resource scarcity, EndpointConversion factors are the actual Endpoint Characterization factors
+    fossil_exception = endpoint_df_by_flow['Flowable'].values
+    fossil = (df2['Flowable'].isin(fossil_exception).values[:, None]
+              & ~np.isnan(midpoints))
+    df2[perspectives] = np.where(fossil, conversion, factors)
+
+    df2['Method'] = ends['EndpointMethod']
+    # the endpoint indicator, or the midpoint indicator for endpoint
+    # factors by flowable
+    df2['Indicator'] = ends['EndpointIndicator'].where(
+        np.arange(len(ends)) < len(by_indicator[0]), ends['Indicator'])
+    df2['Indicator unit'] = ends['EndpointUnit']
+    df2['EndpointCategory'] = ends['EndpointCategory']
+    return (df2[df2[perspectives].notna().any(axis=1)]
+            .reset_index(drop=True))
+
+
+def _join(left: pd.DataFrame, right: pd.DataFrame,
+          on: list) -> (np.ndarray, np.ndarray):
+    """Returns the positions of the left and right rows of an inner join on
+    the given columns, ordered by the left rows and then the right rows."""
+    key = group_key(pd.concat([left[on], right[on]], ignore_index=True))
+    left_key, right_key = key[:len(left)], key[len(left):]
+    # the right rows sorted by key, with the range of each key
+    order = np.argsort(right_key, kind='stable')
+    counts = np.bincount(right_key[right_key >= 0],
+                         minlength=key.max(initial=-1) + 2)
+    starts = np.cumsum(counts) - counts + np.count_nonzero(right_key < 0)
+    matches = np.where(left_key >= 0, counts[left_key], 0)
+    left_rows = np.repeat(np.arange(len(left)), matches)
+    offsets = np.arange(len(left_rows)) - np.repeat(
+        np.cumsum(matches) - matches, matches)
+    right_rows = order[starts[left_key[left_rows]] + offsets]
+    return left_rows, right_rows
+
+
+def _summarize(df: pd.DataFrame) -> pd.DataFrame:
+    """Sums up the endpoint factors by endpoint category."""
+    cols = ['Method', 'Method UUID', 'Indicator unit', 'Flowable',
+            'Flow UUID', 'Context', 'Unit', 'CAS No', 'Location',
+            'Location UUID', 'EndpointCategory']
+    key = group_key(df[cols])
+    rows = np.flatnonzero(key >= 0)
+    sums = df[perspectives].iloc[rows].groupby(key[rows]).sum(min_count=1)
+    first = rows[np.unique(key[rows], return_index=True)[1]]
+    endpoint_categories = df[cols].iloc[first].reset_index(drop=True)
+    endpoint_categories[perspectives] = sums.to_numpy()
+    endpoint_categories['Indicator'] = endpoint_categories['EndpointCategory']
+    endpoint_categories['Indicator UUID'] = ""
+    endpoint_categories.drop(columns=['EndpointCategory'], inplace=True)
+    return endpoint_categories
+
+
+def _drop_duplicates(df: pd.DataFrame) -> (pd.DataFrame, int):
+    """Removes the factors of a perspective that are duplicates of a factor
+    in a previous row and returns the frame and the number of removed
+    factors."""
+    keys = [c for c in df.columns if c not in perspectives]
+    length = 0
+    for p in perspectives:
+        duplicates = df.duplicated(subset=keys + [p]) & df[p].notna()
+        length += duplicates.sum()
+        df.loc[duplicates, p] = np.nan
+    return df[df[perspectives].notna().any(axis=1)], length
+
+
+def _to_long(df: pd.DataFrame) -> pd.DataFrame:
+    """Expands a frame with a factor column per perspective to the standard
+    format with one row per perspective and factor."""
+    factors = df[perspectives].to_numpy(dtype=float)
+    rows, cols = np.nonzero(~np.isnan(factors))
+    long = df.drop(columns=perspectives).iloc[rows].reset_index(drop=True)
+    long['Method'] = (long['Method'] + '/'
+                      + np.array(perspectives, dtype=object)[cols])
+    long['Characterization Factor'] = factors[rows, cols]
+    return long[dfutil.lciafmt_cols + [c for c in long.columns
+                                       if c not in dfutil.lciafmt_cols]]
 
 
 def _get_file(method_meta, url=None):
-    fname = "recipe_2016.xlsx"
     if url is None:
         url = method_meta['url']
-    f = cache.get_or_download(fname, url)
+    f = cache.get_or_download(source_file, url)
     return f
 
 
-def _read(file: str) -> pd.DataFrame:
+@cache.parsed(version=3)
+def _read(file: str, parallel=False,
+          workers=None) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    """Read the midpoint factors and the endpoint conversion factors, by
+    indicator and by flow, in a single pass over the workbook. The factors
+    and conversion factors are returned with a column per perspective.
+
+    :param parallel: bool, if True the midpoint sheets are read in a pool of
+        processes; the factors are returned in sheet order in both cases
+    :param workers: int, number of processes for a parallel read, defaults to
+        the number of CPUs but not more than the number of sheets
+    """
     log.info(f"read ReCiPe 2016 from file {file}")
     wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
-    records = []
+    names = []
+    endpoint, endpoint_by_flow = None, None
     for name in wb.sheetnames:
-        if _eqstr(name, "Version") or _eqstr(
-                name, "Midpoint to endpoint factors"):
+        if _eqstr(name, "Version"):
             continue
-        _read_mid_points(wb[name], records)
+        if _eqstr(name, "Midpoint to endpoint factors"):
+            rows = list(wb[name].iter_rows(values_only=True))
+            endpoint, endpoint_by_flow = _read_endpoints(rows)
+        else:
+            names.append(name)
+    if endpoint is None:
+        log.warning(f"no endpoint factors in file {file}")
+        endpoint, endpoint_by_flow = _read_endpoints([])
+    if parallel and len(names) > 1:
+        wb.close()
+        if workers is None:
+            workers = min(len(names), os.cpu_count() or 1)
+        log.info(f"read {len(names)} sheets in {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_open_worker_workbook,
+                                 initargs=(file,)) as pool:
+            frames = list(pool.map(_read_worker_sheet, names))
+    else:
+        frames = [_read_sheet(wb, name) for name in names]
+        wb.close()
+    frames = [f for f in frames if len(f) > 0]
+    df = (pd.concat(frames, ignore_index=True) if len(frames) > 0
+          else _no_factors())
+    return df, endpoint, endpoint_by_flow
 
-    return dfutil.data_frame(records)
 
+def _read_sheet(wb: openpyxl.Workbook, name: str) -> pd.DataFrame:
+    rows = list(wb[name].iter_rows(values_only=True))
+    return _read_mid_points(_SheetLayout(name, rows), rows)
 
-def _read_endpoints(file: str) -> pd.DataFrame:
-    log.info(f"reading endpoint factors from file {file}")
-    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
-    endpoint = pd.DataFrame()
-    endpoints = {}
-    perspectives = ["I", "H", "E"]
-    indicator = ""
-    indicator_unit = ""
-    sheet = wb['Midpoint to endpoint factors']
-    start_row, data_col, with_perspectives = _find_data_start(sheet)
+
+# the workbook of a worker process in a parallel read
+_worker_wb = None
+
+
+def _open_worker_workbook(file: str):
+    global _worker_wb
+    _worker_wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+
+
+def _read_worker_sheet(name: str) -> pd.DataFrame:
+    return _read_sheet(_worker_wb, name)
+
+
+def _read_endpoints(rows: list) -> (pd.DataFrame, pd.DataFrame):
+    log.info("reading endpoint factors")
+    endpoints = []
+    start_row, data_col, with_perspectives = _find_data_start(rows)
     # impact categories in column 1
     flow_col = 0
 
     endpoint_factor_count = 0
-    for row in sheet.iter_rows(min_row=start_row):
-        indicator = xls.cell_str(row[flow_col])
-        indicator_unit = xls.cell_str(row[flow_col+1])
-        for i in range(0, 3):
-            val = xls.cell_f64(row[data_col + i])
-            if val == 0.0:
-                continue
-            endpoints['Method'] = "ReCiPe 2016 - Midpoint/" + perspectives[i]
-            endpoints['EndpointMethod'] = "ReCiPe 2016 - Endpoint/" + perspectives[i]
-            endpoints['EndpointIndicator'] = indicator.replace(' -a', ' - a') # fix missing space
-            endpoints['EndpointUnit'] = indicator_unit
-            endpoints['EndpointConversion'] = val
-            endpoint = pd.concat(
-                [endpoint, pd.DataFrame.from_dict([endpoints])],
-                ignore_index=True)
-            endpoint_factor_count += 1
+    for row in rows[start_row:] if start_row >= 0 else []:
+        indicator = xls.value_str(row[flow_col])
+        indicator_unit = xls.value_str(row[flow_col+1])
+        values = [xls.value_f64(row[data_col + i]) for i in range(0, 3)]
+        values = [np.nan if val == 0.0 else val for val in values]
+        if all(np.isnan(values)):
+            continue
+        # fix missing space
+        indicator = indicator.replace(' -a', ' - a')
+        endpoints.append([midpoint_method, endpoint_method, indicator,
+                          indicator_unit] + values)
+        endpoint_factor_count += len(values) - np.isnan(values).sum()
     log.debug("extracted %i endpoint factors", endpoint_factor_count)
+    endpoint = pd.DataFrame(endpoints, columns=[
+        'Method', 'EndpointMethod', 'EndpointIndicator',
+        'EndpointUnit'] + conversions)
 
     log.info("processing endpoint factors")
     endpoint.loc[endpoint['EndpointUnit'].str.contains('daly', case=False), 'EndpointUnit'] = 'DALY'
@@ -205,124 +336,150 @@ def _read_endpoints(file: str) -> pd.DataFrame:
     return endpoint, endpoint_by_flow
 
 
-def _read_mid_points(sheet: openpyxl.worksheet.worksheet.Worksheet,
-                     records: list):
-    log.debug("try to read midpoint factors from sheet %s", sheet.title)
-
-    start_row, data_col, with_perspectives = _find_data_start(sheet)
-    if start_row < 0:
-        log.debug("could not find a value column in sheet %s", sheet.title)
-        return
-
-    flow_col = _find_flow_column(sheet)
-    if flow_col < 0:
-        return
-
-    cas_col = _find_cas_column(sheet)
-    indicator_unit, flow_unit, unit_col = _determine_units(sheet)
-    compartment, compartment_col = _determine_compartments(sheet)
-    sheet_title = sheet.title.replace('Ecosyste damage', 'Ecosystem damage')
-
-    perspectives = ["I", "H", "E"]
-    factor_count = 0
-    for row in sheet.iter_rows(min_row=start_row):
-        if compartment_col > -1:
-            compartment = xls.cell_str(row[compartment_col])
-        if compartment in contexts:
-            compartment = contexts[compartment]
-        if unit_col > -1:
-            flow_unit = xls.cell_str(row[unit_col])
-            if "/" in flow_unit:
-                flow_unit = flow_unit.split("/")[1].strip()
-        cas = ""
-        if cas_col > -1:
-            cas = format_cas(xls.cell_f64(row[cas_col]))
-
-        if with_perspectives:
-            for i in range(0, 3):
-                val = xls.cell_f64(row[data_col + i])
-                if val == 0.0:
-                    continue
-                dfutil.record(records,
-                              method="ReCiPe 2016 - Midpoint/" + perspectives[i],
-                              indicator=sheet_title,
-                              indicator_unit=indicator_unit,
-                              flow=xls.cell_str(row[flow_col]),
-                              flow_category=compartment,
-                              flow_unit=flow_unit,
-                              cas_number=cas,
-                              factor=val)
-                factor_count += 1
-        else:
-            val = xls.cell_f64(row[data_col])
-            if val == 0.0:
-                continue
-            for p in perspectives:
-                dfutil.record(records,
-                              method="ReCiPe 2016 - Midpoint/" + p,
-                              indicator=sheet_title,
-                              indicator_unit=indicator_unit,
-                              flow=xls.cell_str(row[flow_col]),
-                              flow_category=compartment,
-                              flow_unit=flow_unit,
-                              cas_number=cas,
-                              factor=val)
-                factor_count += 1
-    log.debug("extracted %i factors", factor_count)
-
-
-def _find_data_start(sheet: openpyxl.worksheet.worksheet.Worksheet) -> (int, int, bool):
-    for row in sheet.iter_rows():
-        for cell in row:
-            s = xls.cell_str(cell)
+class _SheetLayout(object):
+    """The layout of a midpoint sheet, determined in one scan of its header
+    rows: the start of the data rows, the columns of the factors, flow names,
+    CAS numbers, units, and compartments, and the units and compartment that
+    apply to the whole sheet."""
+
+    def __init__(self, title: str, rows: list):
+        self.title = title
+        self.start_row, self.data_col, self.with_perspectives = \
+            _find_data_start(rows)
+        if self.start_row < 0:
+            return
+        header = rows[:self.start_row]
+        self.flow_col = _find_flow_column(title, header)
+        self.cas_col = _find_cas_column(header)
+        self.indicator_unit, self.flow_unit, self.unit_col = \
+            _determine_units(title, rows, self.start_row, self.data_col)
+        self.compartment, self.compartment_col = \
+            _determine_compartments(title, rows)
+
+
+def _read_mid_points(layout: _SheetLayout, rows: list) -> pd.DataFrame:
+    log.debug("try to read midpoint factors from sheet %s", layout.title)
+
+    if layout.start_row < 0:
+        log.debug("could not find a value column in sheet %s", layout.title)
+        return _no_factors()
+
+    values = pd.DataFrame(rows[layout.start_row:], dtype=object)
+
+    def column(col: int) -> pd.Series:
+        if col in values.columns:
+            return values[col]
+        return pd.Series([None] * len(values), dtype=object)
+
+    if layout.compartment_col > -1:
+        compartment = pd.Series(xls.values_str(column(layout.compartment_col)))
+    else:
+        compartment = pd.Series([layout.compartment] * len(values),
+                                dtype=object)
+    compartment = compartment.replace(contexts).to_numpy(dtype=object)
+
+    flow_unit = layout.flow_unit
+    if layout.unit_col > -1:
+        flow_unit = pd.Series(xls.values_str(column(layout.unit_col)))
+        per_unit = flow_unit.str.contains("/", regex=False)
+        flow_unit = flow_unit.where(
+            ~per_unit, flow_unit.str.split("/").str[1].str.strip())
+        flow_unit = flow_unit.to_numpy(dtype=object)
+
+    cas = ""
+    if layout.cas_col > -1:
+        codes, numbers = pd.factorize(xls.values_f64(column(layout.cas_col)),
+                                      use_na_sentinel=False)
+        cas = np.array([format_cas(n) for n in numbers], dtype=object)[codes]
+
+    flows = xls.values_str(column(layout.flow_col))
+    if layout.with_perspectives:
+        factors = np.column_stack([
+            xls.values_f64(column(layout.data_col + i)) for i in range(0, 3)])
+    else:
+        factors = np.repeat(
+            xls.values_f64(column(layout.data_col))[:, None], 3, axis=1)
+
+    # a row with a factor column per perspective, for each row with factors
+    present = factors != 0.0
+    row_idx = np.flatnonzero(present.any(axis=1))
+    log.debug("extracted %i factors", present.sum())
+    df = dfutil.from_columns(
+        len(row_idx),
+        method=midpoint_method,
+        indicator=layout.title.replace('Ecosyste damage', 'Ecosystem damage'),
+        indicator_unit=layout.indicator_unit,
+        flow=flows[row_idx],
+        flow_category=compartment[row_idx],
+        flow_unit=(flow_unit if isinstance(flow_unit, str)
+                   else flow_unit[row_idx]),
+        cas_number=cas if isinstance(cas, str) else cas[row_idx],
+    ).drop(columns='Characterization Factor')
+    df[perspectives] = np.where(present, factors, np.nan)[row_idx]
+    return df
+
+
+def _no_factors() -> pd.DataFrame:
+    return pd.DataFrame(columns=[c for c in dfutil.lciafmt_cols
+                                 if c != 'Characterization Factor']
+                        + perspectives)
+
+
+def _find_data_start(rows: list) -> (int, int, bool):
+    """Returns the index of the first data row, the column of the (first)
+    factor column, and whether there are factors for each perspective."""
+    for i, row in enumerate(rows):
+        for col, v in enumerate(row):
+            s = xls.value_str(v)
             if s is None or s == "":
                 continue
             if _eqstr(s, "I") or _containstr(s, "Individualist") or _containstr(s, "Individualistic"):
-                return cell.row + 1, cell.column - 1, True
+                return i + 1, col, True
             if _eqstr(s, "all perspectives"):
-                return cell.row + 1, cell.column - 1, False
-    return -1, -1
+                return i + 1, col, False
+    return -1, -1, False
 
 
-def _find_flow_column(sheet: openpyxl.worksheet.worksheet.Worksheet) -> int:
-    if _containstr(sheet.title, "land", "occupation"):
+def _find_flow_column(title: str, header: list) -> int:
+    if _containstr(title, "land", "occupation"):
         ncol = 1
         return ncol
     ncol = -1
-    for row in sheet.iter_rows():
-        for cell in row:
-            s = xls.cell_str(cell)
+    for row in header:
+        for col, v in enumerate(row):
+            s = xls.value_str(v)
             if _containstr(s, "name") or _containstr(s, "substance"):
-                ncol = cell.column - 1
+                ncol = col
                 log.debug("identified column %i %s for flow names", ncol, s)
                 break
     if ncol < 0:
-        log.debug("no 'name' column in %s, take col=0 for that", sheet.title)
+        log.debug("no 'name' column in %s, take col=0 for that", title)
         ncol = 0
     return ncol
 
 
-def _find_cas_column(sheet: openpyxl.worksheet.worksheet.Worksheet) -> int:
+def _find_cas_column(header: list) -> int:
     ccol = -1
-    for row in sheet.iter_rows():
-        for cell in row:
-            s = xls.cell_str(cell)
+    for row in header:
+        for col, v in enumerate(row):
+            s = xls.value_str(v)
             if _eqstr(s, "cas"):
-                ccol = cell.column - 1
+                ccol = col
                 log.debug("identified column %i %s for CAS numbers", ccol, s)
                 break
     return ccol
 
 
-def _determine_units(sheet: openpyxl.worksheet.worksheet.Worksheet) -> (str, str, int):
+def _determine_units(title: str, rows: list, start_row: int,
+                     data_col: int) -> (str, str, int):
     indicator_unit = "?"
     flow_unit = "?"
     unit_col = -1
-    row, col, _ = _find_data_start(sheet)
-    row -= 2
+    # the unit is given above the header of the factor column
+    row = start_row - 2
 
-    if row > 0:
-        s = xls.cell_str(sheet.cell(row=row, column=col + 1))
+    if row >= 0 and data_col < len(rows[row]):
+        s = xls.value_str(rows[row][data_col])
         if s is not None and s != "":
             if "/" in s:
                 parts = s.strip(" ()").split("/")
@@ -331,24 +488,22 @@ def _determine_units(sheet: openpyxl.worksheet.worksheet.Worksheet) -> (str, str
             else:
                 indicator_unit = s.strip()
 
-    for count, row in enumerate(sheet.iter_rows()):
-        if count > 5:
-            break
-        for cell in row:
-            s = xls.cell_str(cell)
+    for row in rows[:6]:
+        for col, v in enumerate(row):
+            s = xls.value_str(v)
             if _eqstr(s, "Unit"):
-                unit_col = cell.column - 1
+                unit_col = col
                 break
 
     if indicator_unit != "?":
         log.debug("determined indicator unit: %s", indicator_unit)
-    elif _containstr(sheet.title, "land", "transformation"):
+    elif _containstr(title, "land", "transformation"):
         log.debug("unknown indicator unit; assuming it is m2")
         indicator_unit = "m2"
-    elif _containstr(sheet.title, "land", "occupation"):
+    elif _containstr(title, "land", "occupation"):
         log.debug("unknown indicator unit; assuming it is m2*a")
         indicator_unit = "m2*a"
-    elif _containstr(sheet.title, "water", "consumption"):
+    elif _containstr(title, "water", "consumption"):
         log.debug("unknown indicator unit; assuming it is m3")
         indicator_unit = "m3"
     else:
@@ -361,13 +516,13 @@ def _determine_units(sheet: openpyxl.worksheet.worksheet.Worksheet) -> (str, str
         log.debug("take units from column %i", unit_col)
     elif flow_unit != "?":
         log.debug("determined flow unit: %s", flow_unit)
-    elif _containstr(sheet.title, "land", "transformation"):
+    elif _containstr(title, "land", "transformation"):
         log.debug("unknown flow unit; assume it is m2")
         flow_unit = "m2"
-    elif _containstr(sheet.title, "land", "occupation"):
+    elif _containstr(title, "land", "occupation"):
         log.debug("unknown flow unit; assuming it is m2*a")
         flow_unit = "m2*a"
-    elif _containstr(sheet.title, "water", "consumption"):
+    elif _containstr(title, "water", "consumption"):
         log.debug("unknown flow unit; assuming it is m3")
         flow_unit = "m3"
     else:
@@ -377,38 +532,36 @@ def _determine_units(sheet: openpyxl.worksheet.worksheet.Worksheet) -> (str, str
     return indicator_unit, flow_unit, unit_col
 
 
-def _determine_compartments(sheet: openpyxl.worksheet.worksheet.Worksheet) -> (str, int):
+def _determine_compartments(title: str, rows: list) -> (str, int):
     compartment_col = -1
-    for count, row in enumerate(sheet.iter_rows()):
-        if count > 5:
-            break
-        for cell in row:
-            s = xls.cell_str(cell)
+    for row in rows[:6]:
+        for col, v in enumerate(row):
+            s = xls.value_str(v)
             if _containstr(s, "compartment") or _containstr(
                     s, "name", "in", "ReCiPe"):
-                compartment_col = cell.column - 1
+                compartment_col = col
                 break
 
     if compartment_col > -1:
         log.debug("found compartment column %i", compartment_col)
         return "", compartment_col
 
-    elif _containstr(sheet.title, "global", "warming") \
-            or _containstr(sheet.title, "ozone") \
-            or _containstr(sheet.title, "particulate") \
-            or _containstr(sheet.title, "acidification"):
+    elif _containstr(title, "global", "warming") \
+            or _containstr(title, "ozone") \
+            or _containstr(title, "particulate") \
+            or _containstr(title, "acidification"):
         log.debug("no compartment column; assuming 'air'")
         return "air", -1
 
-    elif _containstr(sheet.title, "mineral", "resource", "scarcity"):
+    elif _containstr(title, "mineral", "resource", "scarcity"):
         log.debug("no compartment column; assuming 'resource/ground'")
         return "resource/ground", -1
 
-    elif _containstr(sheet.title, "fossil", "resource", "scarcity"):
+    elif _containstr(title, "fossil", "resource", "scarcity"):
         log.debug("no compartment column; assuming 'resource'")
         return "resource", -1
 
-    if _containstr(sheet.title, "water", "consumption"):
+    if _containstr(title, "water", "consumption"):
         log.debug("no compartment column; assuming 'resource/fresh water'")
         return "resource/fresh water", -1
 
@@ -7,6 +7,7 @@ Tool for Reduction and Assessment of Chemicals and Other Environmental
 Impacts (TRACI)
 """
 
+import numpy as np
 import pandas as pd
 import openpyxl
 
@@ -16,11 +17,13 @@ import lciafmt.df as dfutil
 import lciafmt.xls as xls
 
 from lciafmt.util import log, aggregate_factors_for_primary_contexts, format_cas,\
-    datapath
+    datapath, curate_flowables
 
 
 flowables_replace = pd.read_csv(datapath / 'TRACI_2.1_replacement.csv')
 flowables_split = pd.read_csv(datapath / 'TRACI_2.1_split.csv')
+# name of the downloaded workbook in the cache folder
+source_file = "traci_2.1.xlsx"
 
 
 def get(method, add_factors_for_missing_contexts=True, file=None,
@@ -48,19 +51,11 @@ def get(method, add_factors_for_missing_contexts=True, file=None,
     """ due to substances listed more than once with different names
     this replaces all instances of the Original Flowable with a New Flowable
     based on a csv input file, otherwise zero values for CFs will override
-    when there are duplicate names"""
-    for index, row in flowables_replace.iterrows():
-        orig = row['Original Flowable']
-        new = row['New Flowable']
-        df['Flowable'] = df['Flowable'].replace(orig, new)
-
-    """due to substances listed more than once with the same name but different
-    CAS this replaces all instances of the Original Flowable with a New Flowable
-    based on a csv input file according to the CAS"""
-    for index, row in flowables_split.iterrows():
-        cas = row['CAS']
-        new = row['New Flowable']
-        df.loc[df['CAS No'] == cas, 'Flowable'] = new
+    when there are duplicate names. Due to substances listed more than once
+    with the same name but different CAS this also replaces all instances of
+    the Original Flowable with a New Flowable according to the CAS"""
+    df = curate_flowables(df, replacements=flowables_replace,
+                          splits=flowables_split)
 
     length = len(df)
     df.drop_duplicates(keep='first', inplace=True)
@@ -83,50 +78,60 @@ def get(method, add_factors_for_missing_contexts=True, file=None,
     return df
 
 def _get_file(method_meta, url=None):
-    fname = "traci_2.1.xlsx"
     if url is None:
         url = method_meta['url']
-    f = cache.get_or_download(fname, url)
+    f = cache.get_or_download(source_file, url)
     return f
 
+@cache.parsed(version=1)
 def _read(xls_file: str) -> pd.DataFrame:
     """Read the data from Excel with given path into a DataFrame."""
     log.info(f"read TRACI from file {xls_file}")
     wb = openpyxl.load_workbook(xls_file, read_only=True, data_only=True)
     sheet = wb["Substances"]
-    categories = {}
     max_col = sheet.max_column
-    for count, cell in enumerate(list(sheet.rows)[0]):
-        name = xls.cell_str(cell)
-        if name == "":
-            break
+    rows = sheet.iter_rows(values_only=True)
+    header = xls.values_str(next(rows, ()))
+    empty = np.flatnonzero(header == "")
+    if len(empty) > 0:
+        header = header[:empty[0]]
+    # 0-based sheet columns of known categories with their meta data
+    columns, categories = [], []
+    for col, name in enumerate(header):
         cat_info = _category_info(name)
-        if cat_info is not None:
-            categories[count+1] = cat_info
-
-    records = []
-    for row in sheet.iter_rows(min_row=2):
-        flow = xls.cell_str(row[2])
-        if flow == "":
-            break
-        cas = format_cas((row[1]).value)
-        for col in range(4, max_col):
-            cat_info = categories.get(col)
-            if cat_info is None:
-                continue
-            factor = xls.cell_f64(row[col-1])
-            if factor == 0.0:
-                continue
-            dfutil.record(records,
-                          indicator=cat_info[0],
-                          indicator_unit=cat_info[1],
-                          flow=flow,
-                          flow_category=cat_info[2],
-                          flow_unit=cat_info[3],
-                          cas_number=cas,
-                          factor=factor)
+        if cat_info is not None and 3 <= col < max_col - 1:
+            columns.append(col)
+            categories.append(cat_info)
+
+    values = pd.DataFrame(list(rows), dtype=object)
     wb.close()
-    return dfutil.data_frame(records)
+    if values.shape[1] < 3:
+        return dfutil.data_frame([])
+    flows = xls.values_str(values[2])
+    empty = np.flatnonzero(flows == "")
+    if len(empty) > 0:
+        values = values.iloc[:empty[0]]
+        flows = flows[:empty[0]]
+
+    factors = np.zeros((len(values), len(columns)))
+    for i, col in enumerate(columns):
+        if col in values.columns:
+            factors[:, i] = xls.values_f64(values[col])
+    flow_idx, cat_idx = np.nonzero(factors != 0.0)
+    if len(flow_idx) == 0:
+        return dfutil.data_frame([])
+
+    codes, uniques = pd.factorize(values[1].iloc[flow_idx])
+    cas = np.array([format_cas(c) for c in uniques] + [""], dtype=object)
+    categories = np.array(categories, dtype=object).reshape(-1, 4)[cat_idx]
+    return dfutil.from_columns(len(flow_idx),
+                               indicator=categories[:, 0],
+                               indicator_unit=categories[:, 1],
+                               flow=flows[flow_idx],
+                               flow_category=categories[:, 2],
+                               flow_unit=categories[:, 3],
+                               cas_number=cas[codes],
+                               factor=factors[flow_idx, cat_idx])
 
 
 def _category_info(c: str):
@@ -215,6 +220,7 @@ def _category_info(c: str):
     if c == "Human health CF  [CTUnoncancer/kg], Emission to cont. agric. Soil, non-canc.":
         return "Human health - non-cancer", "CTUnoncancer", "soil/agricultural", "kg"
 
+@cache.parsed(version=1)
 def _read_eutro(xls_file: str) -> pd.DataFrame:
     """
     Logic used for selecting US data (max 15 per region):
@@ -244,70 +250,57 @@ def _read_eutro(xls_file: str) -> pd.DataFrame:
                         'NonAg': 'urban'}
     log.info(f"read Eutrophication category from file {xls_file}")
     source_df = pd.read_excel(xls_file, sheet_name="S5. Raw Data")
-    records = []
-    flow_category=[]
-    for i, row in source_df.iterrows():
-        sector = row['Sector']
-        flow = row['Flowable']
-        compartment = row['Emit Compartment']
-        flow_category = context_dict.get(compartment, "n/a")
-        if flow_category == "soil" and flow == "Flow_P":
-            flow_category = f'{flow_category} (P)'
-            # required to enable distinct mappings to ground for these flows
-        aggregation = row['Aggregation Target']
-        region_id = str(row['Target ID'])
-        if aggregation in ("US_Nation", "US_States", "US_Counties"):
-            if aggregation == "US_Nation":
-                region = "00000"
-            elif len(region_id) < 3:
-                region = region_id.ljust(5, '0')
-            else:
-                region = region_id.rjust(5, '0')
-
-        elif (aggregation in ("World", "Countries")):
-            region = row['Name']
-            if region == "United States":
-                ## ^^ Skip US as country in favor of aggregation == "US_Nation"
-                continue
-            elif region == "Russian Federation" and region_id == "254":
-                ## Two entries for Russian Federation, 254 is a very small island
-                continue
-            if sector == "Genrl" and flow == "Flow_N":
-                ## Drops duplicate factors for Flow_N Comp_Fw
-                continue
-        else:
-            # Ignore aggregation == "Continents"
-            continue
-        if flow != "Flow_N":
-            flow_category = f'{flow_category}/{compartment_dict.get(sector)}'
-
-        factor = row['Average Target Value']
-        indicator = ("Eutrophication (Freshwater)" if flow == "Flow_P"
-                     else "Eutrophication (Marine)")
-        unit = ("kg P eq" if indicator == "Eutrophication (Freshwater)"
-                else "kg N eq")
-
-        dfutil.record(records,
-                      indicator=indicator,
-                      indicator_unit=unit,
-                      flow=flow,
-                      flow_category=flow_category,
-                      flow_unit="kg",
-                      factor=factor,
-                      location=region)
-
-        if aggregation == "World":
-        # openLCA requires a factor without location for use by default
-            dfutil.record(records,
-                          indicator=indicator,
-                          indicator_unit=unit,
-                          flow=flow,
-                          flow_category=flow_category,
-                          flow_unit="kg",
-                          factor=factor,
-                          location="")
-
-    df = dfutil.data_frame(records)
+    sector = source_df['Sector']
+    flow = source_df['Flowable']
+    compartment = source_df['Emit Compartment']
+    aggregation = source_df['Aggregation Target']
+    region_id = source_df['Target ID'].astype(str)
+
+    us = aggregation.isin(("US_Nation", "US_States", "US_Counties"))
+    world = aggregation == "World"
+    countries = (world | (aggregation == "Countries")) & ~(
+        ## Skip US as country in favor of aggregation == "US_Nation"
+        (source_df['Name'] == "United States") |
+        ## Two entries for Russian Federation, 254 is a very small island
+        ((source_df['Name'] == "Russian Federation") & (region_id == "254")) |
+        ## Drops duplicate factors for Flow_N Comp_Fw
+        ((sector == "Genrl") & (flow == "Flow_N")))
+    # Ignore aggregation == "Continents"
+    keep = (us | countries).values
+
+    region = source_df['Name'].astype(object).where(~us, region_id.where(
+        region_id.str.len() >= 3, region_id.str.ljust(5, '0'))
+        .str.rjust(5, '0'))
+    region[aggregation == "US_Nation"] = "00000"
+
+    flow_category = compartment.map(context_dict).fillna("n/a")
+    # required to enable distinct mappings to ground for these flows
+    flow_category[(flow_category == "soil") & (flow == "Flow_P")] = 'soil (P)'
+    flow_category = flow_category.where(
+        flow == "Flow_N", flow_category + '/' +
+        sector.map(compartment_dict).fillna('None'))
+
+    freshwater = flow == "Flow_P"
+    indicator = np.where(freshwater, "Eutrophication (Freshwater)",
+                         "Eutrophication (Marine)")
+    unit = np.where(freshwater, "kg P eq", "kg N eq")
+
+    # openLCA requires a factor without location for use by default, so
+    # World rows are repeated without location directly after the row
+    rows = np.flatnonzero(keep)
+    repeat = world.values[rows]
+    rows = np.repeat(rows, np.where(repeat, 2, 1))
+    location = region.values[rows]
+    location[np.flatnonzero(np.r_[False, rows[1:] == rows[:-1]])] = ""
+    df = dfutil.from_columns(
+        len(rows),
+        indicator=indicator[rows],
+        indicator_unit=unit[rows],
+        flow=flow.values[rows],
+        flow_category=flow_category.values[rows],
+        flow_unit="kg",
+        factor=source_df['Average Target Value'].values[rows],
+        location=location)
 
     # Resolve duplicate factors for a single location
     cols_to_keep = [c for c in df.columns if
@@ -5,17 +5,24 @@
 This module contains common functions for processing LCIA methods
 """
 
+import os
+import shutil
 import sys
+from functools import lru_cache
+from types import MappingProxyType
 
 import lciafmt
 import logging as log
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import yaml
 from pathlib import Path
 from esupy.processed_data_mgmt import Paths, FileMeta, load_preprocessed_output,\
     write_df_to_file, write_metadata_to_file, download_from_remote, \
-    mkdir_if_missing
+    mkdir_if_missing, find_file
 from esupy.util import get_git_hash
 from fedelemflowlist.globals import flow_list_specs
 
@@ -30,6 +37,10 @@ log.basicConfig(level=log.INFO, format='%(asctime)s %(levelname)-8s %(message)s'
 
 # Common declaration of write format for package data products
 write_format = "parquet"
+# Columns by which methods stored with partitioned=True are partitioned, and
+# the number of rows per row group in their files
+partition_cols = ['Method', 'Indicator']
+partition_row_group_size = 65536
 
 paths = Paths()
 paths.local_path = paths.local_path / 'lciafmt'
@@ -88,53 +99,134 @@ def format_cas(cas) -> str:
     return str(cas)
 
 
-def aggregate_factors_for_primary_contexts(df) -> pd.DataFrame:
+def aggregate_factors_for_primary_contexts(df, factor_columns=None) -> pd.DataFrame:
     """
     When factors don't exist for flow categories with only a primary context, like "air", but do
     exist for 1 or more categories where secondary contexts are present, like "air/urban", then this
     function creates factors for that primary context as an average of the factors from flows
     with the same secondary context. NOTE this will overwrite factors if they already exist
     :param df: a pandas dataframe for an LCIA method
+    :param factor_columns: list of columns with factors, each is averaged
+        separately over the rows that have a value in that column; defaults
+        to ['Characterization Factor'], for which a missing factor makes the
+        average of its group missing
     :return: a pandas dataframe for an LCIA method
     """
+    skip_missing = factor_columns is not None
+    if factor_columns is None:
+        factor_columns = ['Characterization Factor']
     # Ignore the following impact categories for generating averages
     ignored_categories = ['Land transformation', 'Land occupation',
                           'Water consumption', 'Mineral resource scarcity',
                           'Fossil resource scarcity']
-    indices = df['Context'].str.find('/')
-    ignored_list = df['Indicator'].isin(ignored_categories)
-    i = 0
-    for k in ignored_list.items():
-        if k[1]:
-            indices.update(pd.Series([-1], index=[i]))
-        i = i + 1
-
-    primary_context = []
-    i = 0
-    for c in df['Context']:
-        if indices[i] > 0:
-            sub = c[0:indices[i]]+"/unspecified"
-        else:
-            sub = None
-        i = i + 1
-        primary_context.append(sub)
+    parts = df['Context'].astype(object).str.partition('/')
+    has_primary = ((parts[1] == '/') & (parts[0].str.len() > 0) &
+                   ~df['Indicator'].isin(ignored_categories)).values
+    if not has_primary.any():
+        return df.reset_index(drop=True)
+
+    # Replace the context of rows with a secondary context by the primary
+    # context and aggregate over all fields but flow UUID and old context
+    df_secondary_context_only = df[has_primary].assign(
+        Context=parts[0][has_primary] + '/unspecified')
+    agg_fields = [c for c in df.columns
+                  if c != 'Flow UUID' and c not in factor_columns]
+    key = group_key(df_secondary_context_only[agg_fields])
+    values = (df_secondary_context_only[factor_columns]
+              .to_numpy(dtype=float))
+    valid = np.repeat((key >= 0)[:, None], len(factor_columns), axis=1)
+    if skip_missing:
+        valid &= ~np.isnan(values)
+    groups = np.unique(key[valid.any(axis=1)])
+    if len(groups) == 0:
+        return df.reset_index(drop=True)
+    averages = np.full((len(groups), len(factor_columns)), np.nan)
+    for j in range(len(factor_columns)):
+        rows = np.flatnonzero(valid[:, j])
+        rows = rows[np.argsort(key[rows], kind='stable')]
+        if len(rows) == 0:
+            continue
+        starts = np.flatnonzero(np.r_[True, key[rows][1:] != key[rows][:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+        column = values[rows, j]
+        target = np.searchsorted(groups, key[rows][starts])
+        # average groups of equal size together, row by row like np.average
+        for size in np.unique(sizes):
+            same = np.flatnonzero(sizes == size)
+            averages[target[same], j] = np.average(
+                column[starts[same][:, None] + np.arange(size)], axis=1)
+
+    # the first row of each group holds its values of the aggregated fields
+    unique_keys, first = np.unique(key, return_index=True)
+    first = first[np.searchsorted(unique_keys, groups)]
+    df_secondary_agg = (df_secondary_context_only[agg_fields]
+                        .iloc[first].reset_index(drop=True))
+    df_secondary_agg[factor_columns] = averages
 
-    df['Primary Context'] = primary_context
-    # Subset the df to only include the rows were a primary context was added
-    df_secondary_context_only = df[df['Primary Context'].notnull()]
+    df = pd.concat([df, df_secondary_agg], ignore_index=True, sort=False)
+    return df
 
-    # Determine fields to aggregate over. Do not use flow UUID or old context
-    agg_fields = list(set(df.columns) - {'Context', 'Flow UUID',
-                                         'Characterization Factor'})
 
-    # drop primary context field from df
-    df = df.drop(columns=['Primary Context'])
+def group_key(df) -> np.ndarray:
+    """Return an integer key for the rows of df, ordered like the sorted
+    rows; rows with missing values get the key -1."""
+    key = np.zeros(len(df), dtype='int64')
+    missing = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        missing |= codes < 0
+        key = pd.factorize(key * (len(uniques) + 1) + codes + 1,
+                           sort=True)[0]
+    key[missing] = -1
+    return key
 
-    df_secondary_agg = df_secondary_context_only.groupby(agg_fields, as_index=False).agg(
-        {'Characterization Factor': np.average})
-    df_secondary_agg = df_secondary_agg.rename(columns={"Primary Context": "Context"})
 
-    df = pd.concat([df, df_secondary_agg], ignore_index=True, sort=False)
+def curate_flowables(df, replacements=None, splits=None) -> pd.DataFrame:
+    """Rename flowables of an LCIA method in a single pass.
+
+    :param df: a pandas dataframe for an LCIA method
+    :param replacements: dataframe with the columns 'Original Flowable' and
+        'New Flowable'; the rules are applied in order to the flowable names
+    :param splits: dataframe with the columns 'New Flowable' and 'CAS'; the
+        flowable of all rows with that (formatted) CAS number is set to the
+        new name, this is applied after the replacements
+    :return: the dataframe with updated flowables
+    """
+    flowables = df['Flowable']
+    if replacements is not None and len(replacements) > 0:
+        codes, uniques = pd.factorize(flowables)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        # track which original names end up with which name when the rules
+        # are applied one after another
+        holders = {name: [i] for i, name in enumerate(uniques)}
+        for orig, new in zip(replacements['Original Flowable'],
+                             replacements['New Flowable']):
+            moved = holders.pop(orig, [])
+            log.debug(f"replace '{orig}' with '{new}': "
+                      f"{counts[moved].sum()} rows")
+            holders.setdefault(new, []).extend(moved)
+        names = np.empty(len(uniques), dtype=object)
+        for name, idx in holders.items():
+            names[idx] = name
+        changed = np.flatnonzero(names != np.asarray(uniques, dtype=object))
+        if len(changed) > 0:
+            rows = np.isin(codes, changed)
+            flowables = flowables.copy()
+            flowables[rows] = names[codes[rows]]
+            log.info(f"{rows.sum()} flowables replaced")
+    if splits is not None and len(splits) > 0:
+        cas = df['CAS No']
+        counts = cas.value_counts()
+        for new, number in zip(splits['New Flowable'], splits['CAS']):
+            log.debug(f"set flowable '{new}' for CAS {number}: "
+                      f"{counts.get(number, 0)} rows")
+        new_names = dict(zip(splits['CAS'], splits['New Flowable']))
+        rows = cas.isin(new_names.keys()).values
+        if rows.any():
+            flowables = flowables.copy()
+            flowables[rows] = cas[rows].map(new_names).values
+            log.info(f"{rows.sum()} flowables split by CAS number")
+    df['Flowable'] = flowables
     return df
 
 
@@ -171,12 +263,18 @@ def check_as_class(method_id):
     return method_id
 
 
+@lru_cache(maxsize=None)
+def load_description():
+    """Return the generic method descriptions from description.yaml."""
+    with open(datapath / "description.yaml") as f:
+        return MappingProxyType(yaml.safe_load(f))
+
+
 def generate_method_description(name: str,
                                 indicator: str='',
                                 source_indicator: str=''
                                 ) -> str:
-    with open(datapath / "description.yaml") as f:
-        generic = yaml.safe_load(f)
+    generic = load_description()
     desc = generic['base']
     method = check_as_class(name)
     if type(method) is str:
@@ -240,8 +338,14 @@ def compile_metadata(method_id):
     return metadata
 
 
-def store_method(df, method_id, name=''):
-    """Save the method as a dataframe to parquet file."""
+def store_method(df, method_id, name='', partitioned=False):
+    """Save the method as a dataframe to parquet file.
+
+    :param partitioned: bool, if True the method is saved as a folder of
+        parquet files partitioned by Method and Indicator (hive-style), of
+        which `read_method` only opens the partitions that are selected.
+        Suited for large methods, like regionalized or compiled methods.
+    """
     meta = set_lcia_method_meta(method_id)
     method_path = OUTPUTPATH / meta.category
     if name != '':
@@ -251,16 +355,103 @@ def store_method(df, method_id, name=''):
     meta.tool_meta = compile_metadata(method_id)
     try:
         log.info(f'saving {meta.name_data} to {method_path}')
-        write_df_to_file(df, paths, meta)
+        if partitioned:
+            _write_partitioned(df, _partitioned_path(meta))
+        else:
+            write_df_to_file(df, paths, meta)
+            # a partitioned version would be read in place of the new file
+            shutil.rmtree(_partitioned_path(meta), ignore_errors=True)
         write_metadata_to_file(paths, meta)
     except:
         log.error('Failed to save method')
 
 
-def read_method(method_id):
-    """Return the method stored in output."""
+def _partitioned_path(meta) -> Path:
+    """Return the folder of the partitioned version of a stored method."""
+    return OUTPUTPATH / meta.category / f'{meta.name_data}_v{meta.tool_version}'
+
+
+def _write_partitioned(df, path: Path):
+    """Write the method to a folder with a subfolder per Method and
+    Indicator. The row index is stored with the factors so that the order of
+    the rows can be restored, and the schema of the full frame is kept in
+    the _common_metadata file of the folder."""
+    tmp = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    df = df.reset_index(drop=True)
+    df.to_parquet(tmp, partition_cols=partition_cols, index=True,
+                  row_group_size=partition_row_group_size,
+                  use_dictionary=True)
+    pq.write_metadata(pa.Schema.from_pandas(df, preserve_index=True),
+                      tmp / '_common_metadata')
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def _read_partitioned(path: Path, columns=None, filters=None) -> pd.DataFrame:
+    """Read the method written by `_write_partitioned`; the filters on the
+    partition columns select the subfolders that are opened."""
+    schema = pq.read_schema(path / '_common_metadata')
+    # partition values are strings, also when they look like numbers
+    partitioning = ds.partitioning(
+        pa.schema([schema.field(col) for col in partition_cols]),
+        flavor='hive')
+    df = pd.read_parquet(path, columns=columns, filters=filters,
+                         partitioning=partitioning)
+    if columns is None:
+        columns = [col for col in schema.names if col in df.columns]
+    return df.sort_index()[columns].reset_index(drop=True)
+
+
+def method_filters(indicators=None, methods=None, locations=None) -> list:
+    """Return the filters on the Indicator, Method and Location columns for
+    the given lists of values, in the (column, 'in', values) form of the
+    parquet reader; a list that is None does not filter."""
+    return [(col, 'in', list(values)) for col, values in
+            (('Indicator', indicators), ('Method', methods),
+             ('Location', locations)) if values is not None]
+
+
+def select_method(df, columns=None, indicators=None, methods=None,
+                  locations=None) -> pd.DataFrame:
+    """Return the rows and columns of a method that `read_method` would
+    read for the same arguments."""
+    for col, _, values in method_filters(indicators, methods, locations):
+        df = df[df[col].isin(values)]
+    if columns is not None:
+        df = df[columns]
+    return df.reset_index(drop=True)
+
+
+def read_method(method_id, columns=None, indicators=None, methods=None,
+                locations=None):
+    """Return the method stored in output.
+
+    The columns and the indicators, methods and locations to select are
+    passed to the parquet reader, which then only reads those columns and
+    skips the row groups without matching values. A method stored with
+    partitioned=True is read from its partitions.
+    :param columns: list, if not None, read only those columns
+    :param indicators: list, if not None, read only those indicators
+    :param methods: list, if not None, read only those methods
+    :param locations: list, if not None, read only those locations
+    """
     meta = set_lcia_method_meta(method_id)
-    method = load_preprocessed_output(meta, paths)
+    filters = method_filters(indicators, methods, locations)
+    # the parquet reader does not take empty value lists
+    empty = any(len(values) == 0 for _, _, values in filters)
+    filters = [x for x in filters if len(x[2]) > 0] or None
+    method = None
+    if _partitioned_path(meta).is_dir():
+        method = _read_partitioned(_partitioned_path(meta), columns, filters)
+    elif columns is None and filters is None and not empty:
+        method = load_preprocessed_output(meta, paths)
+    else:
+        f = find_file(meta, paths)
+        if f and os.path.isfile(f):
+            method = pd.read_parquet(f, columns=columns, filters=filters)
+    if method is not None and empty:
+        method = method.iloc[:0]
     method_path = OUTPUTPATH / meta.category
     if method is None:
         log.info(f'{meta.name_data} not found in {method_path}')
@@ -269,6 +460,20 @@ def read_method(method_id):
     return method
 
 
+def stored_method_version(method_id):
+    """Return a value that changes with the stored method: the path and
+    content hash of its parquet file or, for a partitioned method, the
+    modification time of the folder metadata; None when it is not stored."""
+    meta = set_lcia_method_meta(method_id)
+    path = _partitioned_path(meta)
+    if path.is_dir():
+        return str(path), os.stat(path / '_common_metadata').st_mtime_ns
+    f = find_file(meta, paths)
+    if f and os.path.isfile(f):
+        return str(f), lciafmt.cache.file_hash(f)
+    return None
+
+
 def download_method(method_id):
     """Downloads the method from data commons."""
     meta = set_lcia_method_meta(method_id)
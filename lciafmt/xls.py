@@ -5,21 +5,50 @@
 Functions to support reading Microsoft Excel files for lciafmt using openpyxl.
 """
 
+import numpy as np
 import openpyxl
+import pandas as pd
 
 
 def cell_str(cell: openpyxl.worksheet.worksheet.Worksheet.cell) -> str:
-    v = cell.value
+    return value_str(cell.value)
+
+
+def cell_f64(cell: openpyxl.worksheet.worksheet.Worksheet.cell) -> float:
+    return value_f64(cell.value)
+
+
+def value_str(v) -> str:
+    """Same as `cell_str` but for a cell value."""
     if v is None:
         return ""
     return str(v).strip()
 
 
-def cell_f64(cell: openpyxl.worksheet.worksheet.Worksheet.cell) -> float:
-    v = cell.value
+def value_f64(v) -> float:
+    """Same as `cell_f64` but for a cell value."""
     if v is None:
         return 0.0
     try:
         return float(v)
     except ValueError:
         return 0.0
+
+
+def values_str(values) -> np.ndarray:
+    """Column version of `cell_str` for a sequence of cell values."""
+    s = pd.Series(values, dtype=object)
+    return (s.where(s.notna(), "").map(str).str.strip()
+            .to_numpy(dtype=object))
+
+
+def values_f64(values) -> np.ndarray:
+    """Column version of `cell_f64` for a sequence of cell values."""
+    s = pd.Series(values, dtype=object)
+    is_str = s.map(type).eq(str).values
+    f = pd.to_numeric(s.where(~is_str), errors='coerce').to_numpy(dtype=float)
+    # strings are converted like float() in cell_f64
+    f[is_str] = [value_f64(v) for v in s[is_str]]
+    f[s.isna().values] = 0.0
+    return f
+
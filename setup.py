@@ -12,6 +12,7 @@ setup(
                       "esupy @ git+https://github.com/USEPA/esupy.git#egg=esupy",
                       "olca-schema>=0.0.11",
                       "pandas>=0.22",
+                      "pyarrow>=6.0",
                       "openpyxl>=3.0.7",
                       "pyyaml>=5.3"
                       ],
@@ -0,0 +1,135 @@
+"""Tests the cache of parsed source files."""
+import pandas as pd
+
+import lciafmt.cache as cache
+
+
+def test_parsed(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'get_folder',
+                        lambda create=False: str(tmp_path / "cache"))
+    calls = []
+
+    @cache.parsed(version=1)
+    def read(file):
+        calls.append(file)
+        return (pd.DataFrame({'Flowable': ['a', 'b'], 'Factor': [1.0, 2.0]}),
+                pd.DataFrame({'Flowable': ['c']}))
+
+    source = tmp_path / "source.txt"
+    source.write_text("version 1")
+    first = read(source)
+    second = read(source)
+    assert len(calls) == 1
+    assert isinstance(second, tuple)
+    for expected, actual in zip(first, second):
+        pd.testing.assert_frame_equal(expected, actual)
+
+    # a changed file is parsed again
+    source.write_text("version 2")
+    read(source)
+    assert len(calls) == 2
+
+
+def test_parsed_prune(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'get_folder',
+                        lambda create=False: str(tmp_path / "cache"))
+
+    @cache.parsed(version=1)
+    def read(file):
+        return pd.DataFrame({'Flowable': [file.read_text()]})
+
+    @cache.parsed(version=1)
+    def read_other(file):
+        return pd.DataFrame({'Flowable': [file.read_text()]})
+
+    def entries():
+        return [f.name for f in (tmp_path / "cache" / "parsed").iterdir()]
+
+    first, second = tmp_path / "first.txt", tmp_path / "second.txt"
+    first.write_text("version 1")
+    second.write_text("version 1")
+    read(first)
+    read(second)
+    read_other(first)
+    assert len(entries()) == 3
+
+    # only the older result of the same function and file is deleted
+    before = entries()
+    first.write_text("version 2")
+    read(first)
+    assert len(entries()) == 3
+    assert len(set(before) - set(entries())) == 1
+    assert any("read_other_" in f for f in entries())
+    first.write_text("version 1")
+    assert list(read(first)['Flowable']) == ["version 1"]
+    assert len(entries()) == 3
+
+
+def test_method(monkeypatch):
+    monkeypatch.setattr(cache, '_methods', cache.OrderedDict())
+    monkeypatch.setattr(cache, '_method_counts', {'hits': 0, 'misses': 0})
+    versions = {'a': 1, 'b': 1}
+
+    def get(key):
+        return cache._method((key,), lambda: versions[key],
+                             lambda: pd.DataFrame({'Flowable': [key] * 100}))
+
+    first = get('a')
+    first['Flowable'] = 'changed'
+    assert list(get('a')['Flowable'].unique()) == ['a']
+    versions['a'] = 2
+    get('a')
+    assert cache.method_cache_info()['hits'] == 1
+    assert cache.method_cache_info()['misses'] == 2
+
+    # the least recently used method is evicted
+    monkeypatch.setattr(cache, 'MAX_METHODS_MEMORY',
+                        cache.method_cache_info()['memory'] * 1.5)
+    get('b')
+    assert list(cache._methods) == [('b',)]
+
+
+def test_method_source(tmp_path, monkeypatch):
+    import lciafmt
+    monkeypatch.setattr(cache, '_methods', cache.OrderedDict())
+    monkeypatch.setattr(cache, '_method_counts', {'hits': 0, 'misses': 0})
+    monkeypatch.setattr(cache, 'get_folder',
+                        lambda create=False: str(tmp_path))
+    source = tmp_path / lciafmt.traci.source_file
+    monkeypatch.setattr(lciafmt, '_get_method', lambda *args: pd.DataFrame(
+        {'Flowable': [source.read_text()]}))
+
+    source.write_text("version 1")
+    for _ in range(2):
+        df = lciafmt.get_method(lciafmt.Method.TRACI)
+        assert list(df['Flowable']) == ["version 1"]
+        df['Flowable'] = "changed"
+    assert cache.method_cache_info()['hits'] == 1
+
+    # a replaced source in the cache folder is read again
+    source.write_text("version 2")
+    df = lciafmt.get_method(lciafmt.Method.TRACI)
+    assert list(df['Flowable']) == ["version 2"]
+    assert cache.method_cache_info()['misses'] == 2
+
+
+def test_mapped_method(tmp_path, monkeypatch):
+    import lciafmt
+    from lciafmt import util
+    monkeypatch.setattr(cache, '_methods', cache.OrderedDict())
+    monkeypatch.setattr(cache, '_method_counts', {'hits': 0, 'misses': 0})
+    path = tmp_path / "method.parquet"
+    monkeypatch.setattr(util, 'find_file', lambda meta, paths: str(path))
+    monkeypatch.setattr(util, 'OUTPUTPATH', tmp_path)
+
+    pd.DataFrame({'Indicator': ['a', 'b'], 'Factor': [1.0, 2.0]}).to_parquet(path)
+    for _ in range(2):
+        df = lciafmt.get_mapped_method(lciafmt.Method.TRACI, indicators=['b'])
+        assert list(df['Factor']) == [2.0]
+    assert cache.method_cache_info()['hits'] == 1
+
+    # a changed file is read again
+    pd.DataFrame({'Indicator': ['b'], 'Factor': [3.0]}).to_parquet(path)
+    df = lciafmt.get_mapped_method(lciafmt.Method.TRACI, indicators=['b'])
+    assert list(df['Factor']) == [3.0]
+    assert cache.method_cache_info()['misses'] == 2
@@ -0,0 +1,50 @@
+"""Tests building the FEDEFL inventory method from a flow list."""
+import types
+
+import pandas as pd
+
+from lciafmt import cache, fedefl_inventory
+
+
+def test_get(monkeypatch):
+    flows = pd.DataFrame({
+        'Flowable': ["Coal", "Water, fresh", "Uranium", "Crude oil"],
+        'CAS No': "", 'Formula': "", 'Synonyms': "",
+        'Unit': ["kg", "kg", "kg", "MJ"],
+        'Class': ["Energy", "Water", "Energy", "Energy"],
+        'External Reference': "", 'Preferred': 1,
+        'Context': ["resource/ground", "resource/water", "resource/ground",
+                    "resource/ground"],
+        'Flow UUID': ["a", "b", "c", "d"],
+        'AltUnit': "", 'AltUnitConversionFactor': None})
+    alt_units = pd.DataFrame({'Flowable': ["Coal"], 'Unit': ["kg"],
+                              'AltUnit': ["MJ"],
+                              'AltUnitConversionFactor': [26.4],
+                              'InverseConversionFactor': [1 / 26.4]})
+    # the layout of fedelemflowlist.subset_list: the subsets map the names
+    # of the inventories to the functions that select their flows
+    subsets = types.SimpleNamespace(
+        subsets={"energy": "get_energy_flows",
+                 "water_resources": "get_water_resource_flows",
+                 "ced": "get_cumulative_energy_demand_flows"},
+        inventory_unit={"energy": "MJ", "water_resources": "kg",
+                        "ced": "MJ"},
+        get_energy_flows=lambda fl: fl[fl['Class'] == "Energy"],
+        get_water_resource_flows=lambda fl: fl[fl['Class'] == "Water"],
+        get_cumulative_energy_demand_flows=lambda fl: fl)
+    subsets.get_subsets = lambda: list(subsets.subsets.keys())
+    subsets.get_inventory_unit = lambda subset: subsets.inventory_unit[subset]
+    monkeypatch.setattr(fedefl_inventory, 'subsets', subsets)
+    monkeypatch.setattr(cache, 'get_flows', lambda: flows.copy())
+    monkeypatch.setattr(cache, 'get_alt_conversion', lambda: alt_units)
+
+    df = fedefl_inventory.get()
+    assert list(df['Indicator']) == ["energy"] * 3 + ["water_resources"]
+    assert list(df['Flow UUID']) == ["a", "c", "d", "b"]
+    assert list(df['Characterization Factor']) == [26.4, 1.0, 1.0, 1.0]
+    assert set(df['Method']) == {"FEDEFL Inventory"}
+    assert 'Class' not in df
+
+    parallel = fedefl_inventory.get(["water_resources", "energy"],
+                                    parallel=True, workers=2)
+    assert list(parallel['Flow UUID']) == ["b", "a", "c", "d"]
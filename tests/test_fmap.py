@@ -1,5 +1,11 @@
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
 
+import pandas as pd
+
+import lciafmt.df as dfutil
 import lciafmt.fmap as fmap
 from lciafmt.fmap import norm_category as norm
 
@@ -27,10 +33,87 @@ class NormCategoryTest(unittest.TestCase):
             norm("Emission to air / high population density, long-term"),
             "air/urban, long-term")
 
+    def test_norm_categories(self):
+        categories = pd.Series(["Emission to air / unspecified",
+                                "air/unspecified", None,
+                                "Emission to water / ground water"])
+        norm = fmap.norm_categories(categories)
+        self.assertEqual(norm.dtype, "category")
+        self.assertEqual(list(norm.cat.categories),
+                         ["air/unspecified", "water/ground"])
+        self.assertTrue(pd.isna(norm[2]))
+        self.assertEqual(norm[3], "water/ground")
+
     def test_get_systems(self):
         systems = fmap.supported_mapping_systems()
         self.assertTrue(len(systems) > 0)
 
 
+class MapperTest(unittest.TestCase):
+
+    mapping = pd.DataFrame(
+        [["Test", "a", "", "air", "kg", "A1", "uuid-a1", "air", "kg", 1.0],
+         ["Test", "a", "", "air", "kg", "A2", "", "air/urban", "", 2.0],
+         ["Test", "b", "", "water", "", "B", "uuid-b", "water", "kg", "0.5"],
+         ["Other", "c", "", "air", "kg", "C", "uuid-c", "air", "kg", 1.0]],
+        columns=["SourceListName", "SourceFlowName", "SourceFlowUUID",
+                 "SourceFlowContext", "SourceUnit", "TargetFlowName",
+                 "TargetFlowUUID", "TargetFlowContext", "TargetUnit",
+                 "ConversionFactor"])
+
+    def method(self) -> pd.DataFrame:
+        records = []
+        for flow, context in [("a", "Emission to air"), ("B", "water"),
+                              ("c", "air"), ("d", None)]:
+            dfutil.record(records, method="M", indicator="I", flow=flow,
+                          flow_category=context, flow_unit="kg", factor=2.0)
+        return dfutil.data_frame(records)
+
+    def test_vectorized_matches_rows(self):
+        for preserve_unmapped in (True, False):
+            rows = fmap.Mapper(self.method(), system="Test",
+                               mapping=self.mapping, vectorized=False,
+                               preserve_unmapped=preserve_unmapped).run()
+            cols = fmap.Mapper(self.method(), system="Test",
+                               mapping=self.mapping,
+                               preserve_unmapped=preserve_unmapped).run()
+            pd.testing.assert_frame_equal(rows, cols)
+
+    def test_compile_map_table(self):
+        table = fmap.compile_map_table(self.mapping, system="Test")
+        self.assertEqual(list(table["key"]),
+                         ["a/air/kg", "a/air/kg", "b/water/kg"])
+        self.assertEqual(table["TargetUnit"][1], "kg")
+        self.assertTrue(fmap._is_strv(table["TargetFlowUUID"][1]))
+        self.assertEqual(table["ConversionFactor"][2], 0.5)
+
+    def test_map_table_version(self):
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(fmap, "OUTPUTPATH", Path(folder)), \
+                mock.patch.object(fmap, "_map_tables", {}), \
+                mock.patch.object(fmap.cache, "get_flowmapping",
+                                  return_value=self.mapping):
+            with mock.patch.object(fmap, "MAP_TABLE_VERSION", 0):
+                stale = fmap.get_map_table("Test")
+                stale["TargetFlowName"] = "stale"
+                stale.to_parquet(next(Path(folder, "mapping").iterdir()))
+                fmap._map_tables.clear()
+                self.assertEqual(
+                    set(fmap.get_map_table("Test")["TargetFlowName"]),
+                    {"stale"})
+            # a table of an older version is not reused
+            table = fmap.get_map_table("Test")
+            self.assertEqual(list(table["TargetFlowName"]),
+                             ["A1", "A2", "B"])
+            self.assertEqual(len(list(Path(folder, "mapping").iterdir())), 2)
+
+    def test_one_to_many(self):
+        mapped = fmap.Mapper(self.method(), system="Test",
+                             mapping=self.mapping).run()
+        self.assertEqual(list(mapped["Flowable"]), ["A1", "A2", "B"])
+        self.assertEqual(list(mapped["Characterization Factor"]),
+                         [2.0, 1.0, 4.0])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,81 @@
+"""Tests reading ImpactWorld+ from a SQLite copy of the database."""
+import sqlite3
+
+from lciafmt import cache, iw
+
+
+def _database(path):
+    cnxn = sqlite3.connect(path)
+    cnxn.execute(f"CREATE TABLE [{iw.not_regionalized_table}] "
+                 "(ID, ImpCat, IUnit, Comp, Sub, Flow, CAS, CF, FUnit)")
+    cnxn.execute(f"INSERT INTO [{iw.not_regionalized_table}] VALUES "
+                 "(1, 'Ozone layer depletion', 'kg CFC-11 eq', 'Air', "
+                 "'(unspecified)', 'Methane, bromo-', 74839, 0.57, 'kg')")
+    for table, _ in iw.regional_tables:
+        if table == iw.particulate_matter_table:
+            cnxn.execute(f"CREATE TABLE [{table}] "
+                         "(ImpCat, Unit, [Elem flow], [Archetype 1], Region, "
+                         "CFvalue)")
+            cnxn.executemany(f"INSERT INTO [{table}] VALUES (?,?,?,?,?,?)", [
+                ("Particulate matter", "[DALY/kg]", "PM2.5", "urban",
+                 "World", 1.0),
+                ("Particulate matter", "[DALY/kg]", "PM2.5", "urban",
+                 "US+Latin America", 2.0)])
+            continue
+        cnxn.execute(f"CREATE TABLE [{table}] "
+                     "(ImpCat, Unit, [Elem flow], [Region code], Resolution, "
+                     "[Weighted Average])")
+        cnxn.executemany(f"INSERT INTO [{table}] VALUES (?,?,?,?,?,?)", [
+            ("Category", "[PDF.m2.yr/m3]", "unspecified", "GLO", "Global", 1.0),
+            ("Category", "[PDF.m2.yr/m3]", "unspecified", "USA", "Country", 2.0),
+            ("Category", "[PDF.m2.yr/m3]", "lake", "CAN", "Not regionalized",
+             3.0)])
+    cnxn.commit()
+    cnxn.close()
+
+
+def test_read(tmp_path):
+    path = str(tmp_path / "iw.sqlite")
+    _database(path)
+    df, usa = iw._select_regions(iw._read.__wrapped__(path), [None, "USA"])
+    assert len(df) == 1 + 1 + 8 * 2
+    first = df.iloc[0]
+    assert first['CAS No'] == "74-83-9"
+    assert first['Context'] == "Air/(unspecified)"
+    assert first['Location'] == "Global"
+    water = df[df['Flowable'].str.startswith("Water, ")]
+    assert list(water['Context']) == list(water['Flowable'])
+    assert list(water['Characterization Factor']) == [1.0, 3.0] * 2
+    assert list(water['Location']) == ["GLO"] * 4
+    assert set(df['Indicator unit']) == {"kg CFC-11 eq", "DALY", "PDF.m2.yr"}
+    assert set(df['Unit']) == {"kg", "m3"}
+
+    pm = usa[usa['Indicator'] == "Particulate matter"]
+    assert list(pm['Location']) == ["US+Latin America"]
+    assert list(pm['Context']) == ["Air/urban"]
+    assert list(pm['Characterization Factor']) == [2.0]
+    assert set(usa['Location']) == {"Global", "USA", "US+Latin America"}
+
+
+def test_get_regions(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'get_folder',
+                        lambda create=False: str(tmp_path / "cache"))
+    path = str(tmp_path / "iw.sqlite")
+    _database(path)
+    methods = iw.get(file=path, region=[None, "USA", "CAN"])
+    assert list(methods) == [None, "USA", "CAN"]
+    for region, df in methods.items():
+        assert df.equals(iw.get(file=path, region=region))
+    assert set(methods["CAN"]['Location']) == {"Global", "CAN", "World"}
+    assert set(methods["CAN"]['Method']) == {"ImpactWorld+ - Midpoint",
+                                             "ImpactWorld+ - Endpoint"}
+
+
+def test_to_sqlite(tmp_path, monkeypatch):
+    source = str(tmp_path / "source.sqlite")
+    _database(source)
+    monkeypatch.setattr(iw, "fetch_size", 2)
+    copy = iw.to_sqlite(source, str(tmp_path / "copy.sqlite"))
+    a = iw._read.__wrapped__(source)
+    b = iw._read.__wrapped__(copy)
+    assert a.equals(b)
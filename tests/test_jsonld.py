@@ -0,0 +1,97 @@
+"""Tests writing methods as JSON-LD."""
+import json
+import zipfile
+
+import olca_schema as o
+import olca_schema.units as units
+import pytest
+
+import lciafmt
+import lciafmt.df as dfutil
+from lciafmt import jsonld
+
+
+def test_fast_factor_json():
+    flow = o.Ref(ref_type=o.RefType.Flow, id='flow-id', name='Methane',
+                 category='air')
+    location = o.Ref(ref_type=o.RefType.Location, id='loc-id', name='US')
+    ind = o.ImpactCategory(id='ind-id', name='Global warming',
+                           ref_unit='kg CO2 eq', impact_factors=[],
+                           direction=o.Direction.OUTPUT,
+                           source=o.Ref(ref_type=o.RefType.Source, id='s'))
+    factors = []
+    for value, loc in [(28.5, None), (1e-12, location), (3, None),
+                       (float('nan'), None), (None, None)]:
+        ind.impact_factors.append(o.ImpactFactor(
+            flow=flow, flow_property=units.property_ref('kg'),
+            unit=units.unit_ref('kg'), value=value, location=loc))
+        factors.append(jsonld._factor_json(
+            flow=jsonld._fragment(flow),
+            flow_property=jsonld._fragment(units.property_ref('kg')),
+            unit=jsonld._fragment(units.unit_ref('kg')),
+            value=jsonld._number(value),
+            location=jsonld._fragment(loc)))
+    expected = ind.to_json()
+    ind.impact_factors = []
+    assert jsonld._category_json(ind, factors) == expected
+    assert jsonld._category_json(ind, []) == ind.to_json()
+
+
+def _read_zip(path) -> dict:
+    with zipfile.ZipFile(path) as z:
+        entities = {n: json.loads(z.read(n)) for n in z.namelist()}
+    for e in entities.values():
+        e.pop('lastChange', None)
+    return entities
+
+
+def test_fast_writer(tmp_path):
+    records = []
+    for indicator, flow, context, factor in [
+            ('Global warming', 'Methane', 'air', 28.5),
+            ('Acidification', 'Ammonia', 'air', 1.88),
+            ('Global warming', 'Carbon dioxide', 'air', 1.0)]:
+        dfutil.record(records, method='Test method', indicator=indicator,
+                      indicator_unit='kg eq', flow=flow,
+                      flow_category=context, flow_unit='kg', factor=factor)
+    df = dfutil.data_frame(records)
+    lciafmt.to_jsonld(df.copy(), tmp_path / 'objects.zip')
+    lciafmt.to_jsonld(df.copy(), tmp_path / 'fast.zip', fast=True)
+    assert (_read_zip(tmp_path / 'objects.zip') ==
+            _read_zip(tmp_path / 'fast.zip'))
+
+
+def _method():
+    records = []
+    for indicator, flow, factor in [
+            ('Global warming', 'Methane', 28.5),
+            ('Global warming', 'Carbon dioxide', 1.0),
+            ('Global warming', 'Nitrous oxide', 265.0),
+            ('Acidification', 'Ammonia', 1.88),
+            ('Acidification', 'Sulfur dioxide', 1.0),
+            ('Eutrophication', 'Phosphorus', 7.29)]:
+        dfutil.record(records, method='Test method', indicator=indicator,
+                      indicator_unit='kg eq', flow=flow,
+                      flow_category='air', flow_unit='kg', factor=factor)
+    return dfutil.data_frame(records)
+
+
+def test_stream(tmp_path):
+    df = _method()
+    lciafmt.to_jsonld(df.copy(), tmp_path / 'objects.zip')
+    # an indicator may continue in the next chunk
+    chunks = [df.iloc[:2].copy(), df.iloc[2:4].copy(), df.iloc[4:].copy()]
+    lciafmt.to_jsonld(chunks, tmp_path / 'stream.zip', stream=True)
+    assert (_read_zip(tmp_path / 'objects.zip') ==
+            _read_zip(tmp_path / 'stream.zip'))
+    chunks = [df.iloc[:2].copy(), df.iloc[2:4].copy(), df.iloc[4:].copy()]
+    lciafmt.to_jsonld(chunks, tmp_path / 'fast.zip', stream=True, fast=True)
+    assert (_read_zip(tmp_path / 'objects.zip') ==
+            _read_zip(tmp_path / 'fast.zip'))
+
+
+def test_stream_not_contiguous(tmp_path):
+    df = _method()
+    chunks = [df.iloc[:2].copy(), df.iloc[3:].copy(), df.iloc[2:3].copy()]
+    with pytest.raises(ValueError, match="not contiguous"):
+        lciafmt.to_jsonld(chunks, tmp_path / 'stream.zip', stream=True)
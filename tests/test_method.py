@@ -0,0 +1,28 @@
+"""Tests lookup of Method objects from the methods.json metadata."""
+import unittest
+import lciafmt
+from lciafmt import Method
+
+
+class TestMethodLookup(unittest.TestCase):
+
+    def test_get_class(self):
+        self.assertEqual(Method.get_class('TRACI'), Method.TRACI)
+        self.assertEqual(Method.get_class('TRACI 2.1'), Method.TRACI)
+        self.assertEqual(Method.get_class('TRACI2.1'), Method.TRACI)
+        self.assertEqual(Method.get_class('ReCiPe 2016 - Midpoint/H'),
+                         Method.RECIPE_2016)
+        self.assertEqual(Method.get_class('not a method'), 'not a method')
+
+    def test_metadata_read_only(self):
+        meta = Method.RECIPE_2016.get_metadata()
+        self.assertIs(meta['case_insensitivity'], True)
+        with self.assertRaises(TypeError):
+            meta['name'] = 'changed'
+        lciafmt.reload_metadata()
+        self.assertEqual(Method.RECIPE_2016.get_metadata()['name'],
+                         'ReCiPe 2016')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Tests reading the ReCiPe 2016 workbook."""
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import lciafmt.df as dfutil
+from lciafmt import cache, recipe
+
+
+@pytest.fixture(autouse=True)
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'get_folder',
+                        lambda create=False: str(tmp_path / "cache"))
+
+
+def _workbook(path, endpoint=True):
+    wb = openpyxl.Workbook()
+    wb.active.title = "Version"
+    sheet = wb.create_sheet("Global Warming")
+    sheet.append([None, None, None, "kg CO2 eq / kg"])
+    sheet.append(["CAS", "Substance name", "Compartment",
+                  "Individualist", "Hierarchist", "Egalitarian"])
+    sheet.append([74828, "Methane", "urban air", 84, 34, None])
+    sheet = wb.create_sheet("Mineral resource scarcity")
+    sheet.append(["Name", "Unit", "(kg Cu eq/kg)"])
+    sheet.append([None, None, "all perspectives"])
+    sheet.append(["Copper", "kg/kg", 1.0])
+    if not endpoint:
+        wb.save(path)
+        return
+    sheet = wb.create_sheet("Midpoint to endpoint factors")
+    sheet.append(["Midpoint", "Unit", "Individualist", "Hierarchist",
+                  "Egalitarian"])
+    sheet.append(["Global Warming - Human health", "DALY/kg CO2 eq",
+                  8.1e-8, 9.3e-7, 1.3e-5])
+    wb.save(path)
+
+
+def test_read(tmp_path):
+    path = tmp_path / "recipe.xlsx"
+    _workbook(path)
+    df, endpoint, _ = recipe._read(path)
+    assert list(df['Method']) == ["ReCiPe 2016 - Midpoint"] * 2
+    assert list(df['Flowable']) == ["Methane", "Copper"]
+    assert list(df['CAS No']) == ["74-82-8", ""]
+    assert list(df['Context']) == ["air/urban", "resource/ground"]
+    assert list(df['Indicator unit']) == ["kg CO2 eq", "kg Cu eq"]
+    assert list(df['I']) == [84, 1]
+    assert list(df['H']) == [34, 1]
+    assert df['E'].isna().tolist() == [True, False]
+    assert list(endpoint['EndpointUnit']) == ["DALY"]
+    assert list(endpoint.filter(like='EndpointConversion').iloc[0]) == [
+        8.1e-8, 9.3e-7, 1.3e-5]
+
+
+def test_read_midpoints_only(tmp_path):
+    path = tmp_path / "recipe.xlsx"
+    _workbook(path, endpoint=False)
+    df, endpoint, endpoint_by_flow = recipe._read(path)
+    assert list(df['Flowable']) == ["Methane", "Copper"]
+    assert len(endpoint) == 0
+    assert len(endpoint_by_flow) == 0
+    assert set(recipe.conversions) <= set(endpoint.columns)
+    # the result is stored and read again from the cache
+    _, cached, _ = recipe._read(path)
+    assert list(cached.columns) == list(endpoint.columns)
+
+    method = recipe.get(file=path)
+    assert set(method['Method'].str[:-2]) == {recipe.midpoint_method}
+    pd.testing.assert_frame_equal(
+        method.drop(columns='EndpointCategory'),
+        recipe.get(file=path, endpoint=False))
+
+
+def test_get_summary(tmp_path):
+    path = tmp_path / "recipe.xlsx"
+    _workbook(path)
+    summary = recipe.get(file=path, summary=True)
+    assert len(summary) > 0
+    assert set(summary['Method'].str[:-2]) == {recipe.endpoint_method}
+    # the endpoints for the summary are generated without endpoint=True
+    pd.testing.assert_frame_equal(
+        summary, recipe.get(file=path, endpoint=False, summary=True))
+
+
+def test_to_long():
+    df = pd.DataFrame({'Method': ["ReCiPe 2016 - Midpoint"] * 2,
+                       'Flowable': ["Methane", "Copper"],
+                       'I': [84, 1], 'H': [34, 1], 'E': [np.nan, 1]})
+    for col in dfutil.lciafmt_cols:
+        if col not in df.columns and col != 'Characterization Factor':
+            df[col] = ""
+    long = recipe._to_long(df)
+    assert list(long.columns) == dfutil.lciafmt_cols
+    assert list(long['Method'].str[-1]) == ["I", "H", "I", "H", "E"]
+    assert list(long['Flowable']) == ["Methane"] * 2 + ["Copper"] * 3
+    assert list(long['Characterization Factor']) == [84, 34, 1, 1, 1]
+
+
+def test_read_parallel(tmp_path):
+    path = tmp_path / "recipe.xlsx"
+    _workbook(path)
+    # bypass the cache of parsed files
+    expected = recipe._read.__wrapped__(path)
+    actual = recipe._read.__wrapped__(path, parallel=True, workers=2)
+    for e, a in zip(expected, actual):
+        pd.testing.assert_frame_equal(e, a)
+
+
+def test_join():
+    left = pd.DataFrame({'Method': ["m", "m", "m"],
+                         'Indicator': ["a", "b", "a"]})
+    right = pd.DataFrame({'Method': ["m", "m", "n", "m"],
+                          'Indicator': ["a", "c", "a", "a"]})
+    left_rows, right_rows = recipe._join(left, right, ["Method", "Indicator"])
+    merged = left.reset_index().merge(right.reset_index(), how="inner",
+                                      on=["Method", "Indicator"])
+    assert list(left_rows) == list(merged['index_x'])
+    assert list(right_rows) == list(merged['index_y'])
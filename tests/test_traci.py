@@ -0,0 +1,62 @@
+"""Tests reading the TRACI workbook."""
+import openpyxl
+import pandas as pd
+import pytest
+
+from lciafmt import cache, traci
+
+
+@pytest.fixture(autouse=True)
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'get_folder',
+                        lambda create=False: str(tmp_path / "cache"))
+
+
+def test_read(tmp_path):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.title = "Substances"
+    sheet.append(["No", "CAS", "Name", "Formula",
+                  "Global Warming Air (kg CO2 eq / kg substance)",
+                  "Unknown category",
+                  "Acidification Air (kg SO2 eq / kg substance)",
+                  "Notes"])
+    sheet.append([1, 74828, "methane ", None, 28, 1, None, None])
+    sheet.append([2, "x", "ammonia", None, "0", 1, "1.88", None])
+    sheet.append([3, None, None, None, 1, 1, 1, None])
+    sheet.append([4, None, "after the end", None, 1, 1, 1, None])
+    path = tmp_path / "traci.xlsx"
+    wb.save(path)
+
+    df = traci._read(path)
+    assert list(df['Flowable']) == ["methane", "ammonia"]
+    assert list(df['CAS No']) == ["74-82-8", ""]
+    assert list(df['Indicator']) == ["Global warming", "Acidification"]
+    assert list(df['Context']) == ["air", "air"]
+    assert list(df['Characterization Factor']) == [28.0, 1.88]
+
+
+def test_read_eutro(tmp_path):
+    path = tmp_path / "eutro.xlsx"
+    pd.DataFrame({
+        'Sector': ['Genrl', 'Agric', 'Genrl', 'Genrl', 'NonAg'],
+        'Flowable': ['Flow_P', 'Flow_P', 'Flow_NOx as N', 'Flow_N', 'Flow_P'],
+        'Emit Compartment': ['Comp_Fw', 'Comp_Soil', 'Comp_Air', 'Comp_Fw',
+                             'Comp_Fw'],
+        'Aggregation Target': ['US_States', 'US_Counties', 'World',
+                               'Countries', 'Continents'],
+        'Target ID': [1, 1001, 0, 40, 3],
+        'Name': ['Alabama', 'Autauga', 'World', 'Austria', 'Europe'],
+        'Average Target Value': [0.5, 0.25, 2.0, 1.0, 3.0],
+    }).to_excel(path, sheet_name="S5. Raw Data", index=False)
+
+    df = traci._read_eutro(path).set_index(['Location', 'Context'])
+    assert df.loc[('10000', 'freshwater/unspecified'),
+                  'Characterization Factor'] == 0.5
+    assert df.loc[('01001', 'soil (P)/rural'),
+                  'Characterization Factor'] == 0.25
+    assert df.loc[('World', 'air/unspecified'),
+                  'Indicator'] == "Eutrophication (Marine)"
+    assert df.loc[('', 'air/unspecified'),
+                  'Characterization Factor'] == 2.0
+    assert len(df) == 4
@@ -0,0 +1,83 @@
+"""Tests the shared functions for LCIA method data frames."""
+import numpy as np
+import pandas as pd
+
+import lciafmt
+from lciafmt import util
+from lciafmt.util import curate_flowables
+
+
+def test_curate_flowables():
+    df = pd.DataFrame({'Flowable': ['a', 'b', 'c', 'a'],
+                       'CAS No': ['1-1', '', '2-2', '3-3']})
+    replacements = pd.DataFrame({'Original Flowable': ['a', 'x'],
+                                 'New Flowable': ['x', 'y']})
+    splits = pd.DataFrame({'New Flowable': ['c, other CAS'],
+                           'CAS': ['3-3']})
+    df = curate_flowables(df, replacements=replacements, splits=splits)
+    assert list(df['Flowable']) == ['y', 'b', 'c', 'c, other CAS']
+
+
+def test_aggregate_factors_missing():
+    df = pd.DataFrame({'Indicator': ['a'] * 4,
+                       'Flowable': ['x', 'x', 'y', 'y'],
+                       'Context': ['air/urban', 'air/rural'] * 2,
+                       'Flow UUID': ['1', '2', '3', '4'],
+                       'Characterization Factor': [1.0, np.nan, 2.0, 4.0]})
+    # a missing factor makes the average of its group missing
+    agg = util.aggregate_factors_for_primary_contexts(df.copy())
+    assert list(agg['Context'][4:]) == ['air/unspecified'] * 2
+    assert list(agg['Flowable'][4:]) == ['x', 'y']
+    assert np.isnan(agg['Characterization Factor'][4])
+    assert agg['Characterization Factor'][5] == 3.0
+
+    # explicit factor columns are averaged over the existing factors
+    agg = util.aggregate_factors_for_primary_contexts(
+        df.copy(), factor_columns=['Characterization Factor'])
+    assert list(agg['Characterization Factor'][4:]) == [1.0, 3.0]
+
+
+def test_read_method(tmp_path, monkeypatch):
+    df = pd.DataFrame({
+        'Method': ["TRACI 2.1"] * 4 + ["TRACI 2.2"] * 2,
+        'Indicator': ["Acidification", "Acidification", "Ozone depletion",
+                      "Smog formation", "Acidification", "Smog formation"],
+        'Location': ["", "", "US", "", "", "US"],
+        'Characterization Factor': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+    path = tmp_path / "method.parquet"
+    df.to_parquet(path, row_group_size=2)
+    monkeypatch.setattr(util, 'find_file', lambda meta, paths: str(path))
+
+    method = util.read_method(lciafmt.Method.TRACI,
+                              columns=['Characterization Factor'],
+                              indicators=["Acidification"],
+                              methods=["TRACI 2.1"])
+    assert list(method.columns) == ['Characterization Factor']
+    assert list(method['Characterization Factor']) == [1.0, 2.0]
+    for selection in [{'locations': ["US"]},
+                      {'indicators': [], 'methods': ["TRACI 2.2"]},
+                      {'columns': ['Indicator', 'Location'],
+                       'methods': ["TRACI 2.2"]}]:
+        method = util.read_method(lciafmt.Method.TRACI, **selection)
+        assert method.equals(util.select_method(df, **selection))
+
+
+def test_read_method_partitioned(tmp_path, monkeypatch):
+    df = pd.DataFrame({
+        'Method': ["TRACI 2.1", "ReCiPe 2016 - Midpoint/I", "TRACI 2.1", "1"],
+        'Indicator': ["Acidification", "Acidification", "Smog formation",
+                      "2"],
+        'Location': ["", "US", "", ""],
+        'Characterization Factor': [1.0, 2.0, 3.0, 4.0]})
+    monkeypatch.setattr(util, 'OUTPUTPATH', tmp_path)
+    meta = util.set_lcia_method_meta(lciafmt.Method.TRACI)
+    util._write_partitioned(df, util._partitioned_path(meta))
+
+    assert util.read_method(lciafmt.Method.TRACI).equals(df)
+    for selection in [{'indicators': ["Acidification"]},
+                      {'methods': ["ReCiPe 2016 - Midpoint/I", "1"],
+                       'columns': ['Characterization Factor', 'Method']},
+                      {'locations': [""], 'indicators': ["Smog formation"]},
+                      {'methods': []}]:
+        method = util.read_method(lciafmt.Method.TRACI, **selection)
+        assert method.equals(util.select_method(df, **selection))